@@ -0,0 +1,46 @@
+import time
+
+import networkx as nx
+import numpy as np
+
+from xautoml.graph_similarity import GraphMatching
+
+COMPONENTS = ['imputation', 'scaling', 'encoding', 'pca', 'selection', 'polynomial', 'svc', 'random_forest',
+              'gradient_boosting', 'knn']
+
+
+def synthetic_pipeline(n_nodes: int, cid: str, random_state: np.random.RandomState) -> nx.DiGraph:
+    g = nx.DiGraph()
+    g.add_node('SOURCE', cids=[cid], other_paths={})
+
+    # Parallel branches of random components. Node names are shared between pipelines to provoke matches
+    frontier = ['SOURCE']
+    for i in range(n_nodes - 1):
+        node = '{}:{}'.format(COMPONENTS[random_state.randint(len(COMPONENTS))], i % (n_nodes // 2 + 1))
+        if node in g:
+            continue
+        parents = random_state.choice(frontier, size=min(len(frontier), random_state.randint(1, 3)), replace=False)
+        g.add_node(node, label=node, cids=[cid], other_paths={}, edge_labels={})
+        for p in parents:
+            g.add_edge(p, node)
+        frontier = (frontier + [node])[-5:]
+    return g
+
+
+def benchmark(n_nodes: int, n_graphs: int = 5, seed: int = 0):
+    random_state = np.random.RandomState(seed)
+    graphs = [synthetic_pipeline(n_nodes, '00:{:02d}'.format(i), random_state) for i in range(n_graphs)]
+
+    start = time.time()
+    merged, _ = GraphMatching.create_structure_history(graphs)
+    duration = time.time() - start
+
+    assert nx.is_directed_acyclic_graph(merged)
+    return len(merged), duration
+
+
+if __name__ == '__main__':
+    print('{:>8} {:>14} {:>10}'.format('nodes', 'merged nodes', 'time [s]'))
+    for n in [50, 100, 200, 500]:
+        n_merged, duration = benchmark(n)
+        print('{:>8} {:>14} {:>10.3f}'.format(n, n_merged, duration))
@@ -3,7 +3,7 @@ import {JupyterContext} from "../../util";
 import React from "react";
 import {ParallelCoordinates} from "../pc/parallel_corrdinates";
 import {DetailsModel} from "./model";
-import {ID} from "../../jupyter";
+import {ID, ServerError} from "../../jupyter";
 import {StructureSearchGraph} from "../search_space/structure_search_graph";
 import {LoadingIndicator} from "../../util/loading";
 import {WarningIndicator} from "../../util/warning";
@@ -34,11 +34,20 @@ class SMBOSurrogateCPC extends React.Component<SurrogateExplanationProps, Surrog
         this.state = {explanation: this.props.explanation, loading: this.props.explanation === undefined}
     }
 
+    private static readonly MAX_RETRIES = 60
+
+    private retryTimeout: number = undefined
+    private retries: number = 0
+
     componentDidMount() {
         if (this.state.explanation === undefined)
             this.simulateExplanation()
     }
 
+    componentWillUnmount() {
+        window.clearTimeout(this.retryTimeout)
+    }
+
     private simulateExplanation() {
         const {model} = this.props
 
@@ -48,6 +57,13 @@ class SMBOSurrogateCPC extends React.Component<SurrogateExplanationProps, Surrog
                 this.setState({explanation: resp, loading: false})
             })
             .catch(error => {
+                if (error instanceof ServerError && error.name === 'ForestNotReady' &&
+                    this.retries < SMBOSurrogateCPC.MAX_RETRIES) {
+                    // Surrogate model is still trained in the background
+                    this.retries += 1
+                    this.retryTimeout = window.setTimeout(() => this.simulateExplanation(), 1000)
+                    return
+                }
                 console.error(`Failed to fetch simulated surrogate data.\n${error.name}: ${error.message}`)
                 this.setState({explanation: undefined, loading: false})
             });
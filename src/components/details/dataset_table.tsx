@@ -1,4 +1,7 @@
 import React from "react";
+import {Table, TableBody, TableCell, TableContainer, TableHead, TablePagination, TableRow} from "@material-ui/core";
+import TableSortLabel from "@material-ui/core/TableSortLabel";
+import {OutputRows} from "../../dao";
 
 interface DatasetTableProps {
     data: string
@@ -67,3 +70,80 @@ export class DataSetTable extends React.Component<DatasetTableProps> {
         );
     }
 }
+
+
+interface PagedDatasetTableProps {
+    rows: OutputRows
+    rowsPerPage: number
+    sortBy: string | undefined
+    ascending: boolean
+    selectedSample: number | undefined
+    onSampleClick?: (idx: number) => void
+    onPageChange: (page: number) => void
+    onSortChange: (column: string) => void
+}
+
+/**
+ * Renders a single window of rows of a data set. Paging and sorting are performed by the kernel, so that only the
+ * displayed rows are transferred.
+ */
+export class PagedDataSetTable extends React.Component<PagedDatasetTableProps> {
+
+    private static formatValue(value: number | boolean | string | null, dtype: string) {
+        if (value === null)
+            return 'NaN'
+        if (dtype === 'number' && !Number.isInteger(value))
+            return (value as number).toFixed(4)
+        return String(value)
+    }
+
+    render() {
+        const {rows, rowsPerPage, sortBy, ascending, selectedSample, onSampleClick} = this.props
+
+        return (
+            <div style={{overflowX: 'auto'}} className={'jp-RenderedHTMLCommon raw-dataset'}>
+                <TableContainer>
+                    <Table size={'small'}>
+                        <TableHead>
+                            <TableRow>
+                                <TableCell/>
+                                {rows.columns.map(column => (
+                                    <TableCell key={column.name} align={column.dtype === 'number' ? 'right' : 'left'}
+                                               sortDirection={sortBy === column.name ? (ascending ? 'asc' : 'desc') : false}>
+                                        <TableSortLabel active={sortBy === column.name}
+                                                        direction={sortBy === column.name && !ascending ? 'desc' : 'asc'}
+                                                        onClick={() => this.props.onSortChange(column.name)}>
+                                            {column.name}
+                                        </TableSortLabel>
+                                    </TableCell>
+                                ))}
+                            </TableRow>
+                        </TableHead>
+                        <TableBody>
+                            {rows.index.map((idx, i) => (
+                                <TableRow key={idx} hover={true}
+                                          className={idx === selectedSample ? 'selected-config' : undefined}
+                                          onClick={() => onSampleClick && onSampleClick(idx)}>
+                                    <TableCell component={'th'}>{idx}</TableCell>
+                                    {rows.columns.map(column => (
+                                        <TableCell key={column.name} align={column.dtype === 'number' ? 'right' : 'left'}>
+                                            {PagedDataSetTable.formatValue(column.values[i], column.dtype)}
+                                        </TableCell>
+                                    ))}
+                                </TableRow>
+                            ))}
+                        </TableBody>
+                    </Table>
+                </TableContainer>
+                <TablePagination
+                    rowsPerPageOptions={[rowsPerPage]}
+                    component='div'
+                    count={rows.total}
+                    rowsPerPage={rowsPerPage}
+                    page={Math.floor(rows.offset / rowsPerPage)}
+                    onPageChange={(_, page) => this.props.onPageChange(page)}
+                />
+            </div>
+        );
+    }
+}
@@ -84,6 +84,21 @@ export type LocalExplanation = Array<[string, number]>
 
 export type OutputDescriptionData = Map<string, string>
 
+export interface OutputColumn {
+    name: string
+    dtype: 'number' | 'boolean' | 'string'
+    values: (number | boolean | string | null)[]
+}
+
+export interface OutputRows {
+    step: string
+    missing: boolean
+    total: number
+    offset: number
+    index: number[]
+    columns: OutputColumn[]
+}
+
 export interface PerformanceData {
     duration: number
     val_score: number
@@ -12,6 +12,7 @@ import {
     LinePoint,
     LocalExplanation,
     OutputDescriptionData,
+    OutputRows,
     PDPResponse,
     PerformanceData,
     PipelineHistory,
@@ -202,6 +203,64 @@ export class Jupyter {
         notebook.activeCell.editor.focus()
     }
 
+    requestRunHistory(runhistory: any, onComplete?: (runhistory: any) => void): Promise<any> {
+        // Large run histories only contain a summary. Structures and explanations are requested page-wise. The
+        // returned promise resolves after the first page, all further pages are passed to onComplete once available
+        if (runhistory.pages === undefined)
+            return Promise.resolve(runhistory)
+
+        // Each structure is contained completely in its first page, later pages only contain further configs.
+        // Interned configspaces and pipelines are indexed per page and get shifted into one combined list
+        const structures = new Map<CandidateId, any>()
+        const configspaces: string[] = []
+        const pipelines: any[][] = []
+        const merge = (page: any) => {
+            const csOffset = configspaces.length
+            const pipelineOffset = pipelines.length
+            configspaces.push(...(page.configspaces ?? []))
+            pipelines.push(...(page.pipelines ?? []))
+
+            page.structures.forEach((s: any) => {
+                if (structures.has(s.cid)) {
+                    structures.get(s.cid).configs.push(...s.configs)
+                    return
+                }
+                if (typeof s.configspace === 'number')
+                    s.configspace += csOffset
+                if (typeof s.pipeline === 'number')
+                    s.pipeline += pipelineOffset
+                structures.set(s.cid, s)
+            })
+        }
+        // Configs of already exported structures are extended by later pages. Export copies of them
+        const snapshot = (explanations: any) => ({
+            meta: runhistory.meta,
+            default_configspace: runhistory.default_configspace,
+            structures: Array.from(structures.values()).map(s => ({...s, configs: [...s.configs]})),
+            configspaces: [...configspaces],
+            pipelines: [...pipelines],
+            explanations: explanations
+        })
+
+        // The kernel executes requests in order. Request the first page and explanations before all further pages
+        const first = this.executeCode<any>(`gcx()._run_history_page(0)`)
+        const explanations = this.executeCode<any>(`gcx()._explanations()`)
+        const pages: Promise<any>[] = []
+        if (onComplete !== undefined)
+            for (let i = 1; i < runhistory.pages; i++)
+                pages.push(this.executeCode<any>(`gcx()._run_history_page(${i})`))
+
+        return Promise.all([first, explanations])
+            .then(([firstPage, explanations]) => {
+                merge(firstPage)
+                if (pages.length > 0)
+                    pages.reduce((previous, page) => previous.then(() => page).then(merge), Promise.resolve())
+                        .then(() => onComplete(snapshot(explanations)))
+                        .catch(e => console.error('Failed to load remaining run history pages', e))
+                return snapshot(explanations)
+            })
+    }
+
     requestPerformanceData(cid: CandidateId): Promise<PerformanceData> {
         return this.memExecuteCode<PerformanceData>(`gcx()._performance_data('${cid}')`)
             .then(data => {
@@ -220,6 +279,14 @@ export class Jupyter {
             .then(data => new Map<string, string>(Object.entries(data)))
     }
 
+    requestOutputRows(cid: CandidateId, step: string, offset: number, limit: number,
+                      sortBy: string = undefined, ascending: boolean = true): Promise<OutputRows> {
+        const sort = sortBy === undefined ? 'None' : JSON.stringify(sortBy)
+        return this.memExecuteCode<OutputRows>(
+            `gcx()._output_rows('${cid}', '${step}', ${offset}, ${limit}, ${sort}, ${ascending ? 'True' : 'False'})`
+        )
+    }
+
     requestOutputDescription(cid: CandidateId): Promise<OutputDescriptionData> {
         return this.memExecuteCode<OutputDescriptionData>(`gcx()._output_description('${cid}')`)
             .then(data => new Map<string, string>(Object.entries(data)))
@@ -278,12 +345,43 @@ export class Jupyter {
             `gcx()._fanova_details('${sid}', '${step}', '${hps[0]}', '${hps[1]}')`
         ).then(data => {
             const details = new Map<string, Map<string, HPImportanceDetails>>(
-                Object.entries(data.details).map(t => [t[0], new Map<string, HPImportanceDetails>(Object.entries(t[1]))])
+                Object.entries(data.details).map(t => [t[0], new Map<string, HPImportanceDetails>(
+                    Object.entries(t[1]).map(([key, value]) => [key, Jupyter.decodeHPImportanceDetails(value)])
+                )])
             )
             return {details: details, error: data.error}
         })
     }
 
+    private static decodeHPImportanceDetails(details: any): HPImportanceDetails {
+        // Marginals are transferred as compact arrays and expanded into the format expected by the charts
+        let data: any
+        if (details.mode === 'heatmap') {
+            data = {}
+            details.y.forEach((y: any, j: number) => {
+                data[y] = {}
+                details.x.forEach((x: any, i: number) => data[y][x] = details.z[i][j])
+            })
+        } else if (details.mode === 'discrete') {
+            data = {}
+            details.labels.forEach((label: any, i: number) =>
+                data[label] = [details.y[i] - details.std[i], details.y[i] + details.std[i]])
+        } else if (details.labels !== undefined) {
+            data = details.x.map((x: number, i: number) => {
+                const row: any = {x: x}
+                details.labels.forEach((label: any, k: number) => row[label] = details.z[k][i])
+                return row
+            })
+        } else {
+            data = details.x.map((x: number, i: number) => ({
+                x: x,
+                y: details.y[i],
+                area: [details.y[i] + details.std[i], details.y[i] - details.std[i]]
+            }))
+        }
+        return {name: details.name, mode: details.mode, data: data}
+    }
+
     requestSimulatedSurrogate(sid: CandidateId, timestamp: number): Promise<BO.Explanation> {
         return this.memExecuteCode<Map<string, Map<string, [number, number][]>>>(
             `gcx()._simulate_surrogate('${sid}', ${timestamp})`
@@ -341,8 +439,16 @@ export class Jupyter {
     requestPipelineHistory(): Promise<PipelineHistory> {
         return this.memExecuteCode<PipelineHistory>(`gcx()._get_pipeline_history()`)
             .then(data => {
+                // Each snapshot only contains the steps added or modified in comparison to the previous snapshot
+                const merged: PipelineStep[][] = []
+                const current = new Map<string, PipelineStep>()
+                data.merged.forEach(diff => {
+                    diff.forEach(d => current.set(d.id, PipelineStep.fromJson(d)))
+                    merged.push(Array.from(current.values()))
+                })
+
                 return {
-                    'merged': data.merged.map(pipeline => pipeline.map(d => PipelineStep.fromJson(d))),
+                    'merged': merged,
                     'individual': data.individual.map(pipeline => pipeline.map(d => PipelineStep.fromJson(d)))
                 }
             })
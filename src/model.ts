@@ -333,11 +333,18 @@ export class Structure {
                 public readonly configs: Candidate[]) {
     }
 
-    static fromJson(structure: Structure, defaultConfigSpace: BO.ConfigSpace): Structure {
-        const pipeline = structure.pipeline.map(s => PipelineStep.fromJson(s))
+    static fromJson(structure: Structure, defaultConfigSpace: BO.ConfigSpace,
+                    configSpaces: BO.ConfigSpace[] = [], pipelines: any[][] = []): Structure {
+        // Configspace and pipeline are either provided inline or as index into the interned values
+        const rawPipeline = structure.pipeline as any
+        const rawConfigSpace = structure.configspace as any
+
+        const pipeline = typeof rawPipeline === 'number' ?
+            pipelines[rawPipeline].map(s => PipelineStep.fromJson({...s, cids: [structure.cid]})) :
+            rawPipeline.map((s: any) => PipelineStep.fromJson(s))
         const configs = structure.configs.map(c => Candidate.fromJson(c))
-        const configSpace = structure.configspace ?
-            BO.ConfigSpace.fromJson(structure.configspace as any) : defaultConfigSpace
+        const configSpace = typeof rawConfigSpace === 'number' ? configSpaces[rawConfigSpace] :
+            rawConfigSpace ? BO.ConfigSpace.fromJson(rawConfigSpace) : defaultConfigSpace
 
         if (!configSpace)
             throw new Error(`Neither configspace nor default_configspace provided for structure ${structure.cid}`)
@@ -368,7 +375,12 @@ export class RunHistory {
         // @ts-ignore
         const default_configspace = runhistory.default_configspace ? BO.ConfigSpace.fromJson(runhistory.default_configspace as any) : undefined
 
-        const structures = runhistory.structures.map(s => Structure.fromJson(s, default_configspace))
+        // @ts-ignore
+        const configspaces = (runhistory.configspaces ?? []).map((cs: any) => BO.ConfigSpace.fromJson(cs))
+        // @ts-ignore
+        const pipelines = runhistory.pipelines ?? []
+
+        const structures = runhistory.structures.map(s => Structure.fromJson(s, default_configspace, configspaces, pipelines))
         const losses = [].concat(...structures.map(s => s.configs.map(c => c.loss)))
 
         return new RunHistory(MetaInformation.fromJson(runhistory.meta, losses),
@@ -1,5 +1,5 @@
 import React from "react";
-import {OutputDescriptionData} from "../dao";
+import {OutputRows} from "../dao";
 import {LoadingIndicator} from "./loading";
 import {DetailsModel} from "../components/details/model";
 import {TwoColumnLayout} from "./layout";
@@ -7,7 +7,7 @@ import {JupyterButton} from "./jupyter-button";
 import {JupyterContext} from "../util";
 import {ErrorIndicator} from "./error";
 import {ID} from "../jupyter";
-import {DataSetTable} from "../components/details/dataset_table";
+import {PagedDataSetTable} from "../components/details/dataset_table";
 
 
 interface RawDatasetProps {
@@ -17,7 +17,10 @@ interface RawDatasetProps {
 
 interface RawDatasetState {
     loadingDf: boolean
-    outputs: OutputDescriptionData
+    rows: OutputRows
+    page: number
+    sortBy: string
+    ascending: boolean
     error: Error
 }
 
@@ -30,6 +33,7 @@ export class RawDataset extends React.Component<RawDatasetProps, RawDatasetState
         'analysis. By selecting a single record in the data set table, local explanations for this records are ' +
         'calculated based on a LIME analysis.'
 
+    private static readonly ROWS_PER_PAGE = 30
 
     static contextType = JupyterContext;
     context: React.ContextType<typeof JupyterContext>;
@@ -38,40 +42,52 @@ export class RawDataset extends React.Component<RawDatasetProps, RawDatasetState
         super(props);
         this.state = {
             loadingDf: false,
-            outputs: new Map<string, string>(),
+            rows: undefined,
+            page: 0,
+            sortBy: undefined,
+            ascending: true,
             error: undefined
         }
 
         this.handleLoadDataframe = this.handleLoadDataframe.bind(this)
+        this.handlePageChange = this.handlePageChange.bind(this)
+        this.handleSortChange = this.handleSortChange.bind(this)
     }
 
     componentDidMount() {
-        this.queryOutputs()
+        this.queryOutputs(0, undefined, true)
     }
 
     componentDidUpdate(prevProps: Readonly<RawDatasetProps>, prevState: Readonly<RawDatasetState>, snapshot?: any) {
         if (prevProps.model.component !== this.props.model.component)
-            this.queryOutputs()
+            this.queryOutputs(0, undefined, true)
+    }
+
+    private queryOutputs(page: number, sortBy: string, ascending: boolean) {
+        const {candidate, component} = this.props.model
 
+        // Only the displayed window of rows is requested. Responses for outdated requests are discarded
+        this.setState({loadingDf: true, page: page, sortBy: sortBy, ascending: ascending, error: undefined})
+        this.context.requestOutputRows(candidate.id, component, page * RawDataset.ROWS_PER_PAGE,
+            RawDataset.ROWS_PER_PAGE, sortBy, ascending)
+            .then(data => {
+                if (this.state.page === page && this.state.sortBy === sortBy && this.state.ascending === ascending &&
+                    this.props.model.component === component)
+                    this.setState({rows: data, loadingDf: false})
+            })
+            .catch(error => {
+                console.error(`Failed to fetch output data: \n${error.name}: ${error.message}`);
+                this.setState({error: error, loadingDf: false})
+            });
     }
 
-    private queryOutputs() {
-        if (this.state.loadingDf) {
-            // Loading already in progress
-            return
-        }
-        if (this.state.outputs.size == 0) {
-            const {candidate} = this.props.model
-
-            // Outputs not cached yet
-            this.setState({loadingDf: true})
-            this.context.requestOutputComplete(candidate.id)
-                .then(data => this.setState({outputs: data, loadingDf: false}))
-                .catch(error => {
-                    console.error(`Failed to fetch output data: \n${error.name}: ${error.message}`);
-                    this.setState({error: error})
-                });
-        }
+    private handlePageChange(page: number) {
+        this.queryOutputs(page, this.state.sortBy, this.state.ascending)
+    }
+
+    private handleSortChange(column: string) {
+        const ascending = this.state.sortBy === column ? !this.state.ascending : true
+        this.queryOutputs(0, column, ascending)
     }
 
     private handleLoadDataframe() {
@@ -85,13 +101,14 @@ ${ID}_X
 
     render() {
         const {component, algorithm, selectedSample} = this.props.model
-        const {loadingDf, outputs, error} = this.state
+        const {loadingDf, rows, sortBy, ascending, error} = this.state
+        const available = rows !== undefined && !rows.missing
 
         return (
             <>
                 <TwoColumnLayout>
                     <h3>Output of <i>{algorithm} ({component})</i></h3>
-                    {(!loadingDf && outputs.has(component)) &&
+                    {(!loadingDf && available) &&
                         <JupyterButton style={{marginTop: 0, float: 'right'}} onClick={this.handleLoadDataframe} active={this.context.canCreateCell()}/>
                     }
                 </TwoColumnLayout>
@@ -101,10 +118,15 @@ ${ID}_X
                         <LoadingIndicator loading={loadingDf}/>
                         {!loadingDf &&
                             <>
-                                {outputs.has(component) ?
-                                    <DataSetTable data={outputs.get(component)}
-                                                  selectedSample={selectedSample}
-                                                  onSampleClick={this.props.onSampleClick}/> :
+                                {available ?
+                                    <PagedDataSetTable rows={rows}
+                                                       rowsPerPage={RawDataset.ROWS_PER_PAGE}
+                                                       sortBy={sortBy}
+                                                       ascending={ascending}
+                                                       selectedSample={selectedSample}
+                                                       onSampleClick={this.props.onSampleClick}
+                                                       onPageChange={this.handlePageChange}
+                                                       onSortChange={this.handleSortChange}/> :
                                     <div>Missing</div>}
                             </>}
                     </>}
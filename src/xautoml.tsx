@@ -38,15 +38,26 @@ export class JupyterWidget extends ReactWidget implements IRenderMime.IRenderer
     }
 
     renderModel(model: IRenderMime.IMimeModel): Promise<void> {
-        try {
-            this.data = OptimizationData.fromJson(model.data[this._mimeType] as unknown as OptimizationData);
-        } catch (e) {
-            console.error('Failed to parse runHistory', e)
-        }
-
-        // Trigger call of render().
-        this.onUpdateRequest(undefined);
-        return this.renderPromise;
+        const raw = model.data[this._mimeType] as any
+
+        return this.jupyter.requestRunHistory(raw.runhistory, runhistory => {
+            // Render again once the remaining pages of large run histories are streamed in
+            try {
+                this.data = OptimizationData.fromJson({...raw, runhistory: runhistory});
+                this.onUpdateRequest(undefined);
+            } catch (e) {
+                console.error('Failed to parse runHistory', e)
+            }
+        })
+            .then(runhistory => {
+                this.data = OptimizationData.fromJson({...raw, runhistory: runhistory});
+            })
+            .catch(e => console.error('Failed to parse runHistory', e))
+            .then(() => {
+                // Trigger call of render().
+                this.onUpdateRequest(undefined);
+                return this.renderPromise;
+            })
     }
 
     protected render() {
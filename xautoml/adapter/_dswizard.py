@@ -1,9 +1,12 @@
+import os
+from functools import partial
+
 import joblib
 from ConfigSpace.read_and_write import json as config_json
 from sklearn.ensemble import VotingClassifier
 
 from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, ConfigExplanation, \
-    Ensemble
+    Ensemble, LazyModel, identity
 
 
 def import_dswizard(dswizard: 'dswizard.core.runhistory.RunHistory', ensemble: VotingClassifier) -> RunHistory:
@@ -26,17 +29,15 @@ def import_dswizard(dswizard: 'dswizard.core.runhistory.RunHistory', ensemble: V
     for struct in dswizard.data.values():
         configs = []
         for res in struct.results:
-            try:
-                with open(res.model_file, 'rb') as f:
-                    pipeline = joblib.load(f)
-
-                configs.append(Candidate(res.cid.external_name, struct.budget, res.status.name,
-                                         res.loss * (1 if meta.is_minimization else -1),
-                                         res.runtime.as_dict(), res.config,
-                                         res.config.origin if res.config is not None else None,
-                                         pipeline, lambda y: y))
-            except FileNotFoundError:
-                pass
+            if res.model_file is None or not os.path.exists(res.model_file):
+                continue
+
+            # Pipelines are only loaded from disk on first access
+            configs.append(Candidate(res.cid.external_name, struct.budget, res.status.name,
+                                     res.loss * (1 if meta.is_minimization else -1),
+                                     res.runtime.as_dict(), res.config,
+                                     res.config.origin if res.config is not None else None,
+                                     LazyModel(partial(joblib.load, res.model_file), res.model_file), identity))
         structures.append(CandidateStructure(struct.cid.without_config().external_name,
                                              struct.configspace, struct.pipeline, configs))
 
@@ -6,7 +6,8 @@ from ConfigSpace import ConfigurationSpace, Configuration, UniformFloatHyperpara
     UniformIntegerHyperparameter, Constant
 from sklearn.pipeline import Pipeline
 
-from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, Ensemble
+from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, Ensemble, \
+    identity
 
 
 def import_flaml(pipeline: Union[Pipeline, 'flaml.AutoML']) -> RunHistory:
@@ -79,7 +80,7 @@ def import_flaml(pipeline: Union[Pipeline, 'flaml.AutoML']) -> RunHistory:
                                   'Success', automl.best_loss_per_estimator[classifier],
                                   {'timestamp': start_time, 'training_time': 1, 'prediction_time': 1},
                                   config, 'FLAML',
-                                  pip, lambda y: y)
+                                  pip, identity)
             candidates[classifier].append(candidate)
 
         structures = []
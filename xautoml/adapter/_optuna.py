@@ -2,7 +2,8 @@ from typing import Dict
 
 from sklearn.pipeline import Pipeline
 
-from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, Ensemble
+from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, Ensemble, \
+    identity
 
 
 def import_optuna(study: 'optuna.study.Study', models: Dict[int, Pipeline], metric: str = 'unknown') -> RunHistory:
@@ -69,7 +70,7 @@ def import_optuna(study: 'optuna.study.Study', models: Dict[int, Pipeline], metr
                           },
                           Configuration(cs, {key.replace('__', ':'): value for key, value in trial.params.items()}),
                           'Optuna',
-                          models.get(trial.number, None), lambda y: y
+                          models.get(trial.number, None), identity
                           )
             )
 
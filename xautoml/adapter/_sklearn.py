@@ -4,7 +4,8 @@ from typing import Union
 import pandas as pd
 from ConfigSpace import ConfigurationSpace, Configuration, UniformFloatHyperparameter, CategoricalHyperparameter
 
-from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, Ensemble
+from xautoml.models import RunHistory, MetaInformation, Explanations, CandidateStructure, Candidate, Ensemble, \
+    identity
 
 
 def import_sklearn(search: Union['sklearn.model_selection.RandomizedSearchCV', 'sklearn.model_selection.GridSearchCV'],
@@ -72,7 +73,7 @@ def import_sklearn(search: Union['sklearn.model_selection.RandomizedSearchCV', '
                                   config,
                                   'Random Search' if isinstance(search, RandomizedSearchCV) else 'Grid Search',
                                   search.best_estimator_ if idx == search.best_index_ else None,
-                                  lambda y: y)
+                                  identity)
             candidates.append(candidate)
 
         return CandidateStructure('0', cs, search.best_estimator_, candidates)
@@ -1,5 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from typing import List
+from threading import Lock
+from typing import List, Dict, Optional
 
 import numpy as np
 import pandas as pd
@@ -12,24 +14,77 @@ from xautoml.util.config import configs_as_dataframe
 from xautoml.util.constants import NUMBER_PRECISION
 
 
+class ConfigEmbedding:
+
+    def __init__(self, n_neighbors: int = 5, refresh_ratio: float = 0.1, min_refresh: int = 10):
+        """
+        State of a 2D configuration embedding that is updated incrementally while an optimization run keeps adding
+        candidates. New configurations are placed into the existing embedding without moving already embedded
+        configurations.
+        :param n_neighbors: number of nearest embedded configurations used for placing a new configuration
+        :param refresh_ratio: the contour surface is only refitted if the number of configurations increased by at
+        least this fraction since the last fit
+        :param min_refresh: minimal number of new configurations before the contour surface is refitted
+        """
+        self.n_neighbors = n_neighbors
+        self.refresh_ratio = refresh_ratio
+        self.min_refresh = min_refresh
+
+        self.cids: List[str] = []
+        self.location: Optional[np.ndarray] = None
+        self.contour: Optional[pd.DataFrame] = None
+        self.n_contour = 0
+
+    def is_valid(self, cids: List[str]) -> bool:
+        return self.location is not None and set(self.cids).issubset(cids)
+
+    def requires_refresh(self, n_configs: int) -> bool:
+        return self.contour is None or \
+               n_configs - self.n_contour >= max(self.min_refresh, self.refresh_ratio * self.n_contour)
+
+
 class ConfigSimilarity:
 
     @staticmethod
     def compute(configspaces: List[ConfigurationSpace], configs: List[List[Configuration]], loss: np.ndarray,
-                is_minimization: bool):
+                is_minimization: bool, max_exact: int = 2000, n_landmarks: int = 500, n_jobs: int = 1,
+                cids: List[str] = None, embedding: ConfigEmbedding = None):
+        """
+        Computes a 2D embedding of all configurations. For up to max_exact configurations metric MDS on the complete
+        distance matrix is used. Larger sets of configurations are embedded via landmark MDS which only requires the
+        distances to n_landmarks randomly selected configurations.
+
+        If an embedding and the candidate ids of all configurations are provided, the embedding is updated
+        incrementally: configurations that are already embedded keep their location and only new configurations are
+        projected into the existing embedding.
+        """
         pruned_cs, configs = ConfigSimilarity._merge_config_spaces(configspaces, configs)
 
         y = loss.astype(float)
-        accumulated_best = np.minmum.accumulate(y) if is_minimization else np.maximum.accumulate(y)
+        accumulated_best = np.minimum.accumulate(y) if is_minimization else np.maximum.accumulate(y)
         incumbent_idx = np.nonzero(np.diff(accumulated_best))
         incumbent_idx = np.concatenate([[0], incumbent_idx[0] + 1])
 
-        dist = ConfigSimilarity.get_distance(pruned_cs, configs)
-        location = ConfigSimilarity.get_2d_location(dist)
-        contour = ConfigSimilarity.get_contour_plot(location, y)
+        if embedding is not None and cids is not None and embedding.is_valid(cids):
+            location = ConfigSimilarity._update_embedding(embedding, pruned_cs, configs, cids, n_jobs)
+        elif configs.shape[0] <= max_exact:
+            dist = ConfigSimilarity.get_distance(pruned_cs, configs, n_jobs=n_jobs)
+            location = ConfigSimilarity.get_2d_location(dist)
+        else:
+            location = ConfigSimilarity.get_2d_location_landmarks(pruned_cs, configs, n_landmarks, n_jobs=n_jobs)
+
+        if embedding is None or cids is None:
+            contour = ConfigSimilarity.get_contour_plot(location, y)
+        else:
+            embedding.cids = list(cids)
+            embedding.location = location
+            if embedding.requires_refresh(location.shape[0]):
+                embedding.contour = ConfigSimilarity.get_contour_plot(location, y)
+                embedding.n_contour = location.shape[0]
+            contour = embedding.contour
 
         location = np.vstack((location.T, np.arange(0, location.shape[0]))).T
-        mask = np.ones(dist.shape[1], np.bool)
+        mask = np.ones(location.shape[0], bool)
         mask[incumbent_idx] = 0
         incumbent_location = location[incumbent_idx]
         location = location[mask]
@@ -65,41 +120,50 @@ class ConfigSimilarity:
         return pruned_cs, configs
 
     @staticmethod
-    def get_distance(cs: ConfigurationSpace, X: pd.DataFrame):
-        n_confs = X.shape[0]
-        n_hp = X.shape[1]
-
-        raw_distance = np.zeros((n_hp, n_confs, n_confs))
-        for n, param in enumerate(X.columns):
-            values = X[param].to_numpy()
-
-            depth = ConfigSimilarity.get_depth(cs, param)
-            difference = np.abs(np.atleast_2d(values) - np.atleast_2d(values).T)
-
-            if type(cs.get_hyperparameter(param) == CategoricalHyperparameter):
-                distance = np.clip(difference, 0, 1) / depth
-            else:
-                distance = difference / depth
-
-            raw_distance[n] = distance
-
-        return raw_distance.sum(axis=0)
+    def get_distance(cs: ConfigurationSpace, X: pd.DataFrame, Y: pd.DataFrame = None, n_jobs: int = 1):
+        """
+        Computes the pairwise distances between the rows of X and Y. If Y is not provided, the distances between all
+        rows of X are computed. The distances of all hyperparameters are accumulated into a single float32 matrix.
+        Hyperparameters can be processed in parallel threads.
+        """
+        if Y is None:
+            Y = X
+        depths = ConfigSimilarity.get_depths(cs)
+
+        distance = np.zeros((X.shape[0], Y.shape[0]), dtype=np.float32)
+        lock = Lock()
+
+        def accumulate(param: str):
+            values_x = X[param].to_numpy(dtype=np.float32)
+            values_y = Y[param].to_numpy(dtype=np.float32)
+            difference = np.abs(values_x[:, np.newaxis] - values_y[np.newaxis, :])
+            # Differences of all hyperparameters are bounded by 1
+            np.clip(difference, 0, 1, out=difference)
+            difference /= depths[param]
+            with lock:
+                np.add(distance, difference, out=distance)
+
+        if n_jobs == 1:
+            for param in X.columns:
+                accumulate(param)
+        else:
+            with ThreadPoolExecutor(max_workers=None if n_jobs < 0 else n_jobs) as executor:
+                list(executor.map(accumulate, X.columns))
+
+        return distance
 
     @staticmethod
-    def get_depth(cs: ConfigurationSpace, param: str):
-        new_parents = cs.get_parents_of(param)
-        d = 1
-        while new_parents:
-            d += 1
-            old_parents = new_parents
-            new_parents = []
-            for p in old_parents:
-                pp = cs.get_parents_of(p)
-                if pp:
-                    new_parents.extend(pp)
-                else:
-                    return d
-        return d
+    def get_depths(cs: ConfigurationSpace) -> Dict[str, int]:
+        """
+        Computes the depth of all hyperparameters in the condition graph, i.e., the length of the shortest path to a
+        root hyperparameter, in a single pass
+        """
+        depths = {}
+        # Hyperparameters are sorted topologically, parents are always visited before their children
+        for hp in cs.get_hyperparameters():
+            parents = [p.name for p in cs.get_parents_of(hp.name)]
+            depths[hp.name] = 1 + min((depths[p] for p in parents if p in depths), default=0)
+        return depths
 
     @staticmethod
     def get_2d_location(dist: np.ndarray):
@@ -107,6 +171,52 @@ class ConfigSimilarity:
         location = mds.fit_transform(dist)
         return location
 
+    @staticmethod
+    def get_2d_location_landmarks(cs: ConfigurationSpace, X: pd.DataFrame, n_landmarks: int = 500,
+                                  block_size: int = 256, random_state: int = 0, n_jobs: int = 1):
+        """
+        Landmark MDS: classical MDS on the distances between a random subset of landmarks. All configurations are
+        projected into this embedding via distance-based triangulation. Distances are computed in blocks of block_size
+        configurations, so that the complete distance matrix is never materialized.
+        """
+        n_landmarks = min(n_landmarks, X.shape[0])
+        landmarks = X.iloc[np.random.RandomState(random_state).choice(X.shape[0], n_landmarks, replace=False)]
+
+        # Classical MDS on the landmarks
+        squared_dist = ConfigSimilarity.get_distance(cs, landmarks, n_jobs=n_jobs).astype(float) ** 2
+        mean_squared_dist = squared_dist.mean(axis=0)
+        centering = np.eye(n_landmarks) - np.ones((n_landmarks, n_landmarks)) / n_landmarks
+        eigenvalues, eigenvectors = np.linalg.eigh(-0.5 * centering @ squared_dist @ centering)
+        top = np.argsort(eigenvalues)[::-1][:2]
+        projection = eigenvectors[:, top] / np.sqrt(np.maximum(eigenvalues[top], np.finfo(float).eps))
+
+        location = np.zeros((X.shape[0], 2))
+        for start in range(0, X.shape[0], block_size):
+            block = ConfigSimilarity.get_distance(cs, X.iloc[start:start + block_size], landmarks,
+                                                 n_jobs=n_jobs).astype(float) ** 2
+            location[start:start + block_size] = -0.5 * (block - mean_squared_dist) @ projection
+        return location
+
+    @staticmethod
+    def _update_embedding(embedding: ConfigEmbedding, cs: ConfigurationSpace, X: pd.DataFrame, cids: List[str],
+                          n_jobs: int = 1) -> np.ndarray:
+        index = {cid: idx for idx, cid in enumerate(embedding.cids)}
+        known = np.array([cid in index for cid in cids], dtype=bool)
+
+        location = np.zeros((len(cids), 2))
+        location[known] = embedding.location[[index[cid] for cid, k in zip(cids, known) if k]]
+        if known.all():
+            return location
+
+        # Place new configurations at the distance weighted mean of their nearest embedded neighbours
+        dist = ConfigSimilarity.get_distance(cs, X[~known], X[known], n_jobs=n_jobs)
+        k = min(embedding.n_neighbors, dist.shape[1])
+        neighbours = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        weights = 1 / (np.take_along_axis(dist, neighbours, axis=1) + 1e-6)
+        location[~known] = (location[known][neighbours] * weights[:, :, np.newaxis]).sum(axis=1) / \
+                           weights.sum(axis=1)[:, np.newaxis]
+        return location
+
     @staticmethod
     def get_contour_plot(X: np.ndarray, y: np.ndarray, n_steps: int = 20) -> pd.DataFrame:
         # noinspection PyTypeChecker
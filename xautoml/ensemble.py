@@ -1,5 +1,5 @@
 import io
-from typing import List
+from typing import List, Optional
 
 import joblib
 import matplotlib
@@ -31,8 +31,9 @@ class EnsembleInspection:
 
     @staticmethod
     def ensemble_overview(ensemble: Ensemble, candidates: List[Candidate], X: pd.DataFrame, y_pred: pd.Series,
-                          n_jobs=1):
-        all_predictions = EnsembleInspection.member_predictions(candidates, X, n_jobs)
+                          n_jobs=1, all_predictions: Optional[np.ndarray] = None):
+        if all_predictions is None:
+            all_predictions = EnsembleInspection.member_predictions(candidates, X, n_jobs)
 
         mask = np.min(all_predictions, axis=0) == np.max(all_predictions, axis=0)
         indices = np.where(~mask)[0]
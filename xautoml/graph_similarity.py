@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Dict, Hashable, Optional
 
 import networkx as nx
 import numpy as np
@@ -73,9 +73,9 @@ def pipeline_to_networkx(pipeline, cid):
     return g
 
 
-def export_json(g: nx.DiGraph):
+def export_json(g: nx.DiGraph, subset: Dict[str, None] = None):
     nodes = []
-    for node, data in g.nodes(data=True):
+    for node, data in (g.nodes(data=True) if subset is None else ((n, g.nodes[n]) for n in subset)):
         nodes.append({
             'id': node,
             'label': data['label'] if 'label' in data else node,
@@ -94,18 +94,76 @@ def export_json(g: nx.DiGraph):
 class GraphMatching:
 
     @staticmethod
-    def create_structure_history(graphs: List[nx.DiGraph]):
+    def create_structure_history(graphs: List[nx.DiGraph], keys: Optional[List[Hashable]] = None):
+        """
+        Incrementally merges all graphs into a single graph. Graphs with an identical key, e.g., the hash of the
+        underlying structure, are matched only once. Subsequent graphs with the same key only add their candidate ids
+        to the already merged nodes. Instead of exporting the complete merged graph after each step, each snapshot only
+        contains the nodes that were added or modified in this step. The first snapshot contains all nodes.
+        :param graphs: pipeline graphs in chronological order
+        :param keys: optional structure keys for each graph
+        :return: tuple containing 1) the merged graph, and 2) the snapshot diffs
+        """
         if len(graphs) == 0:
-            return []
+            return nx.DiGraph(), []
+        if keys is None:
+            keys = [None] * len(graphs)
 
-        merged = graphs[0]
-        history = [export_json(merged)]
-        for graph in graphs[1:]:
-            merged = GraphMatching.merge_graphs(merged, graph)
-            history.append(export_json(merged))
+        merged = nx.DiGraph()
+        mappings: Dict[Hashable, Dict[str, str]] = {}
+        history = []
+        for graph, key in zip(graphs, keys):
+            mapping = mappings.get(key) if key is not None else None
+            if mapping is not None and mapping.keys() == graph.nodes.keys():
+                cids = graph.nodes['SOURCE']['cids']
+                for node in graph.nodes:
+                    merged.nodes[mapping[node]]['cids'] += cids
+            else:
+                mapping = GraphMatching._merge_into(merged, graph)
+                if key is not None and key not in mappings:
+                    mappings[key] = mapping
+            history.append(export_json(merged, dict.fromkeys(mapping.values())))
 
         return merged, history
 
+    @staticmethod
+    def _merge_into(merged: nx.DiGraph, graph: nx.DiGraph) -> Dict[str, str]:
+        """
+        Merges graph into merged in-place
+        :return: mapping from the nodes in graph to the nodes in merged
+        """
+        if len(merged) == 0:
+            equivalence = {}
+        else:
+            _, equivalence = GraphMatching._compute_node_equivalence(merged, graph)
+
+        mapping = {}
+        for node, data in graph.nodes(data=True):
+            if node not in equivalence:
+                merged.add_node(node, **{key: (list(value) if isinstance(value, list) else value)
+                                         for key, value in data.items()})
+                mapping[node] = node
+            else:
+                target = equivalence[node]
+                GraphMatching._merge_node_data(merged.nodes[target], data)
+                mapping[node] = target
+
+        for (source, dest) in graph.edges:
+            merged.add_edge(mapping[source], mapping[dest])
+        return mapping
+
+    @staticmethod
+    def _merge_node_data(target: Dict, data: Dict):
+        for key, value in data.items():
+            if key in target and isinstance(target[key], list):
+                target[key] += value
+            elif key in target and isinstance(target[key], set):
+                target[key] = target[key].union(value)
+            elif key in target and isinstance(target[key], dict):
+                target[key] = {**target[key], **value}
+            else:
+                target[key] = value
+
     @staticmethod
     def merge_graphs(g1: nx.DiGraph, g2: nx.DiGraph):
         equivalence_g1, equivalence_g2 = GraphMatching._compute_node_equivalence(g1, g2)
@@ -118,15 +176,7 @@ class GraphMatching:
             if node not in equivalence_g2:
                 merged.add_node(node, **data)
             else:
-                for key, value in data.items():
-                    if key in merged.nodes[node] and isinstance(merged.nodes[node][key], list):
-                        merged.nodes[node][key] += value
-                    elif key in merged.nodes[node] and isinstance(merged.nodes[node][key], set):
-                        merged.nodes[node][key] = merged.nodes[node][key].union(value)
-                    elif key in merged.nodes[node] and isinstance(merged.nodes[node][key], dict):
-                        merged.nodes[node][key] = {**merged.nodes[node][key], **value}
-                    else:
-                        merged.nodes[node][key] = value
+                GraphMatching._merge_node_data(merged.nodes[node], data)
 
         # Add edges
         for edge in g1.edges:
@@ -141,7 +191,6 @@ class GraphMatching:
 
     @staticmethod
     def _compute_node_equivalence(g1: nx.DiGraph, g2: nx.DiGraph):
-        helper_graph = nx.union(g1, g2, rename=('g1-', 'g2-'))
         equivalence_g1 = {}  # maps nodes from g1 to g2
         equivalence_g2 = {}  # maps nodes from g2 to g1
         len_g1 = len(g1.nodes)
@@ -151,34 +200,27 @@ class GraphMatching:
         rows, cols = linear_sum_assignment(edit_cost_matrix)
         nodes_g1 = list(g1.nodes)
         nodes_g2 = list(g2.nodes)
+
+        # Nodes of g2 are stored with an offset of len_g1 in the reachability matrix
+        reachability = _Reachability(g1, g2)
         for (row, col) in zip(rows, cols):
             if row >= len_g1 or col >= len_g2:
                 continue
 
-            # nodes are equivalent
-            eq_g1 = nodes_g1[row]
-            eq_g2 = nodes_g2[col]
-            merged_helper = nx.algorithms.minors.contracted_nodes(helper_graph, 'g1-' + eq_g1, 'g2-' + eq_g2,
-                                                                  self_loops=False)
-            try:
-                if 'g1-SOURCE' in merged_helper:
-                    nx.algorithms.cycles.find_cycle(merged_helper, source='g1-SOURCE')
-                if 'g2-SOURCE' in merged_helper:
-                    nx.algorithms.cycles.find_cycle(merged_helper, source='g2-SOURCE')
-            except nx.NetworkXNoCycle:
+            # nodes are equivalent if merging them does not introduce a cycle
+            if reachability.contract(row, len_g1 + col):
+                eq_g1 = nodes_g1[row]
+                eq_g2 = nodes_g2[col]
                 equivalence_g2[eq_g2] = eq_g1
                 equivalence_g1[eq_g1] = eq_g2
-                helper_graph = merged_helper
         return equivalence_g1, equivalence_g2
 
     @staticmethod
     def _compute_node_similarity_matrix(g1: nx.DiGraph, g2: nx.DiGraph):
-        similarity = np.zeros([len(g1.nodes), len(g2.nodes)])
-        for idx_g1, n_g1 in enumerate(g1.nodes):
-            for idx_g2, n_g2 in enumerate(g2.nodes):
-                # TODO check if similar algorithm type and use 0.5
-                similarity[idx_g1, idx_g2] = 1 if n_g1 == n_g2 else 0
-        return similarity
+        # TODO check if similar algorithm type and use 0.5
+        labels_g1 = np.array(list(g1.nodes), dtype=object)
+        labels_g2 = np.array(list(g2.nodes), dtype=object)
+        return (labels_g1[:, np.newaxis] == labels_g2[np.newaxis, :]).astype(float)
 
     @staticmethod
     def _compute_edit_cost_matrix(similarity_matrix: np.ndarray, add_cost: float, del_cost: float, inf: float = 1000):
@@ -198,3 +240,55 @@ class GraphMatching:
         cost_matrix[n_nodes_g1:, :n_nodes_g2] = deletion
 
         return cost_matrix
+
+
+class _Reachability:
+
+    def __init__(self, g1: nx.DiGraph, g2: nx.DiGraph):
+        """
+        Transitive closure of the disjoint union of g1 and g2 stored as a boolean matrix. Nodes of g1 are stored in
+        the first len(g1) rows, followed by the nodes of g2. Contracting two nodes updates the closure in-place
+        instead of copying the graph.
+        """
+        self.reachable = np.zeros((len(g1) + len(g2), len(g1) + len(g2)), dtype=bool)
+        self._add_closure(g1, 0)
+        self._add_closure(g2, len(g1))
+
+    def _add_closure(self, g: nx.DiGraph, offset: int):
+        index = {node: offset + idx for idx, node in enumerate(g.nodes)}
+        try:
+            order = list(nx.topological_sort(g))
+        except nx.NetworkXUnfeasible:
+            # Graph already contains a cycle, fall back to the generic closure
+            closure = nx.transitive_closure(g, reflexive=False)
+            for source, dest in closure.edges:
+                self.reachable[index[source], index[dest]] = True
+            return
+
+        for node in reversed(order):
+            successors = [index[s] for s in g.successors(node)]
+            if len(successors) > 0:
+                self.reachable[index[node], successors] = True
+                self.reachable[index[node]] |= self.reachable[successors].any(axis=0)
+
+    def contract(self, a: int, b: int) -> bool:
+        """
+        Contracts node b into node a unless this introduces a cycle
+        :return: True if the nodes got contracted
+        """
+        r = self.reachable
+        # A cycle through the contracted node exists iff a path a -> w -> b or b -> w -> a exists
+        if np.any(r[a] & r[:, b]) or np.any(r[b] & r[:, a]):
+            return False
+
+        descendants = r[a] | r[b]
+        ancestors = r[:, a] | r[:, b]
+        descendants[[a, b]] = False
+        ancestors[[a, b]] = False
+
+        r[np.ix_(ancestors, descendants)] = True
+        r[ancestors, a] = True
+        r[a] = descendants
+        r[b, :] = False
+        r[:, b] = False
+        return True
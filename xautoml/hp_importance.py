@@ -1,56 +1,270 @@
+import heapq
 import itertools as it
+import os
+import pickle
 import tempfile
-from collections import defaultdict
-from typing import Dict, Tuple, List
+import weakref
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from threading import Lock
+from typing import Dict, Tuple, List, Callable
 
 import numpy as np
 import pandas as pd
 from ConfigSpace import CategoricalHyperparameter, ConfigurationSpace, Configuration
 from ConfigSpace.hyperparameters import OrdinalHyperparameter, NumericalHyperparameter, Optional
-from fanova import fANOVA, visualizer
+from fanova import fANOVA
 
 from xautoml.util.config import configs_as_dataframe
 from xautoml.util.constants import NUMBER_PRECISION, SOURCE, SINK
 
 
+def _quantify_pair(pair: Tuple[int, int], f: fANOVA) -> Tuple[float, float]:
+    try:
+        d = f.quantify_importance(pair)
+        return d[pair]['total importance'], d[pair]['total std']
+    except RuntimeError:
+        return 0.5, 0
+
+
+def _quantify_pairs(f: fANOVA, pairs: List[Tuple[int, int]]) -> List[Tuple[float, float]]:
+    return [_quantify_pair(pair, f) for pair in pairs]
+
+
+_forest_files: 'weakref.WeakKeyDictionary[fANOVA, str]' = weakref.WeakKeyDictionary()
+_forest_files_lock = Lock()
+_worker_forests: 'OrderedDict[str, fANOVA]' = OrderedDict()
+
+
+def _forest_file(f: fANOVA) -> str:
+    # Forests are written to disk once and loaded by each worker process only once instead of pickling the forest
+    # with every task. The file is removed together with the forest
+    with _forest_files_lock:
+        if f not in _forest_files:
+            fd, path = tempfile.mkstemp(suffix='.fanova')
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(f, file)
+            _forest_files[f] = path
+            weakref.finalize(f, _remove_file, path)
+        return _forest_files[f]
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _quantify_pairs_from_file(path: str, pairs: List[Tuple[int, int]]) -> List[Tuple[float, float]]:
+    if path in _worker_forests:
+        _worker_forests.move_to_end(path)
+    else:
+        with open(path, 'rb') as file:
+            _worker_forests[path] = pickle.load(file)
+        while len(_worker_forests) > 2:
+            _worker_forests.popitem(last=False)
+    return _quantify_pairs(_worker_forests[path], pairs)
+
+
+class ForestNotReady(Exception):
+    """
+    Raised if a request can only be answered by a forest that is still being trained in the background
+    """
+
+
+class FanovaCache:
+
+    def __init__(self, max_structures: int = 16, max_forests: int = 12):
+        """
+        Bounded LRU cache of fANOVA forests. Forests are identified by a structure hash and the number of
+        chronologically sorted configurations they are trained on.
+        :param max_structures: Maximum number of structures with cached forests. All forests of the least recently used
+        structure are evicted first
+        :param max_forests: Maximum number of cached forests per structure
+        """
+        self.max_structures = max_structures
+        self.max_forests = max_forests
+        self._forests: 'OrderedDict[int, OrderedDict[int, Tuple[fANOVA, pd.DataFrame]]]' = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, hash_: int, count: int) -> Optional[Tuple[fANOVA, pd.DataFrame]]:
+        with self._lock:
+            forests = self._forests.get(hash_)
+            if forests is None or count not in forests:
+                return None
+            self._forests.move_to_end(hash_)
+            forests.move_to_end(count)
+            return forests[count]
+
+    def put(self, hash_: int, count: int, value: Tuple[fANOVA, pd.DataFrame]):
+        with self._lock:
+            forests = self._forests.setdefault(hash_, OrderedDict())
+            forests[count] = value
+            forests.move_to_end(count)
+            self._forests.move_to_end(hash_)
+
+            while len(forests) > self.max_forests:
+                forests.popitem(last=False)
+            while len(self._forests) > self.max_structures:
+                self._forests.popitem(last=False)
+
+    def counts(self, hash_: int) -> List[int]:
+        with self._lock:
+            return list(self._forests.get(hash_, {}).keys())
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(forests) for forests in self._forests.values())
+
+
+class MarginalEngine:
+    _engines: 'weakref.WeakKeyDictionary[fANOVA, MarginalEngine]' = weakref.WeakKeyDictionary()
+
+    def __init__(self, f: fANOVA):
+        """
+        Computes marginal predictions of a fANOVA forest directly in memory. Grids are constructed from the
+        configuration space of the forest. pyrfr only provides marginal predictions for single samples, so grid points
+        are still evaluated one after another. The engine mainly serves as a cache of the marginals, so that engines
+        bound to a cached forest are reused by all hp importance endpoints.
+        """
+        self.f = f
+        self.hps = f.cs.get_hyperparameters()
+        self._cache: Dict[Tuple, Tuple] = {}
+
+    @staticmethod
+    def of(f: fANOVA) -> 'MarginalEngine':
+        if f not in MarginalEngine._engines:
+            MarginalEngine._engines[f] = MarginalEngine(f)
+        return MarginalEngine._engines[f]
+
+    def is_numerical(self, idx: int) -> bool:
+        return isinstance(self.hps[idx], NumericalHyperparameter)
+
+    def labels(self, idx: int) -> List:
+        hp = self.hps[idx]
+        if isinstance(hp, CategoricalHyperparameter):
+            return list(hp.choices)
+        elif isinstance(hp, OrdinalHyperparameter):
+            return list(hp.sequence)
+        else:
+            raise ValueError("Parameter {} of type {} not supported.".format(hp.name, type(hp)))
+
+    def grid(self, idx: int, resolution: int) -> np.ndarray:
+        hp = self.hps[idx]
+        if isinstance(hp, NumericalHyperparameter):
+            if hp.log:
+                return np.logspace(np.log(hp.lower), np.log(hp.upper), resolution, base=np.e)
+            return np.linspace(hp.lower, hp.upper, resolution)
+        # Categorical hyperparameters are encoded by the index of their choices
+        return np.arange(len(self.labels(idx)), dtype=float)
+
+    def predict(self, dims: Tuple[int, ...], points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the marginal mean and standard deviation for all points. Points are evaluated sequentially, results
+        are not cached
+        :param dims: indices of the hyperparameters
+        :param points: array of shape n x len(dims)
+        """
+        sample = np.full((points.shape[0], len(self.hps)), np.nan)
+        sample[:, dims] = points
+
+        prediction = np.array([self.f.the_forest.marginal_mean_variance_prediction(s) for s in sample])
+        return prediction[:, 0], np.sqrt(np.maximum(prediction[:, 1], 0))
+
+    def marginal(self, idx: int, resolution: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        key = (idx, resolution)
+        if key not in self._cache:
+            grid = self.grid(idx, resolution)
+            mean, std = self.predict((idx,), grid[:, np.newaxis])
+            self._cache[key] = grid, mean, std
+        return self._cache[key]
+
+    def pairwise_marginal(self, idx: Tuple[int, int], resolution: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        key = (*idx, resolution)
+        if key not in self._cache:
+            grid1, grid2 = self.grid(idx[0], resolution), self.grid(idx[1], resolution)
+            xx, yy = np.meshgrid(grid1, grid2, indexing='ij')
+            mean, _ = self.predict(idx, np.stack((xx.ravel(), yy.ravel()), axis=1))
+            self._cache[key] = grid1, grid2, mean.reshape(xx.shape)
+        return self._cache[key]
+
+
 class HPImportance:
 
     @staticmethod
     def calculate_fanova_overview(f: fANOVA, X: pd.DataFrame, step: str = None,
-                                  filter_: Optional[ConfigurationSpace] = None, n_head: int = 14):
+                                  filter_: Optional[ConfigurationSpace] = None, n_head: int = 14,
+                                  n_jobs: int = 1, min_importance: float = 0.01, prune: bool = False,
+                                  executor: Optional[Executor] = None):
+        """
+        Calculates the importance of all single hyperparameters and all pairs of hyperparameters.
+        :param n_jobs: Number of processes used for calculating the pairwise importance. -1 uses all available cores.
+        With a single job, all pairs are calculated in-process
+        :param min_importance: Pairs of hyperparameters are skipped if the individual importance of both
+        hyperparameters is below this fraction of the largest individual importance. 0 evaluates all pairs
+        :param prune: Only evaluate pairs of hyperparameters that can be part of the returned rows. Without a step, the
+        pairs are evaluated in order of an upper bound of their importance until the top n_head rows are stable.
+        Otherwise, only pairs containing a hyperparameter of the step are evaluated
+        :param executor: Optional process pool with n_jobs workers reused for calculating the pairwise importance. If
+        not provided and n_jobs is not 1, a temporary pool is created
+        """
         res = {}
 
-        keys = list(zip(range(len(X.columns)), range(len(X.columns)))) + list(it.combinations(range(len(X.columns)), 2))
-
-        for i, j in keys:
-            i_name = f.cs.get_hyperparameter_by_idx(i)
-            j_name = f.cs.get_hyperparameter_by_idx(j)
+        def is_selected(name: str) -> bool:
             try:
-                if (
-                    filter_ is None or (
-                    filter_.get_hyperparameter(i_name) and
-                    filter_.get_hyperparameter(j_name))
-                ):
-                    d = f.quantify_importance((i, j))
-                else:
-                    d = {}  # Never reached, only for typechecker
+                return filter_ is None or bool(filter_.get_hyperparameter(name))
             except KeyError:
-                continue
+                return False
+
+        indices = [i for i in range(len(X.columns)) if is_selected(f.cs.get_hyperparameter_by_idx(i))]
+
+        individual = {}
+        for i in indices:
+            try:
+                d = f.quantify_importance((i,))
+                individual[i] = d[(i,)]['individual importance'], d[(i,)]['individual std']
             except RuntimeError:
-                imp = {'individual importance': 0.5, 'individual std': 0, 'total importance': 0.5, 'total std': 0}
-                d = {(i,): imp, (j,): imp, (i, j): imp}
-            res[(i_name, i_name)] = {
-                'mean': d[(i,)]['individual importance'],
-                'std': d[(i,)]['individual std']
-            }
-            res[(j_name, j_name)] = {
-                'mean': d[(j,)]['individual importance'],
-                'std': d[(j,)]['individual std']
-            }
-            res[(i_name, j_name)] = {
-                'mean': d[(i, j)]['total importance'],
-                'std': d[(i, j)]['total std']
+                individual[i] = 0.5, 0
+            res[(f.cs.get_hyperparameter_by_idx(i), f.cs.get_hyperparameter_by_idx(i))] = {
+                'mean': individual[i][0],
+                'std': individual[i][1]
             }
+
+        threshold = min_importance * max((mean for mean, _ in individual.values()), default=0)
+        pairs = [(i, j) for i, j in it.combinations(indices, 2)
+                 if individual[i][0] >= threshold or individual[j][0] >= threshold]
+
+        n_workers = os.cpu_count() if n_jobs < 0 else n_jobs
+        forest_file = _forest_file(f) if n_jobs != 1 else None
+        with ProcessPoolExecutor(max_workers=n_workers) if executor is None and n_jobs != 1 \
+                else nullcontext(executor if n_jobs != 1 else None) as executor:
+            def quantify(pairs_: List[Tuple[int, int]]):
+                if executor is None or len(pairs_) < 2:
+                    importance = _quantify_pairs(f, pairs_)
+                else:
+                    # Tasks only contain the index pairs, workers load the forest once from forest_file
+                    size = int(np.ceil(len(pairs_) / n_workers))
+                    chunks = [pairs_[i:i + size] for i in range(0, len(pairs_), size)]
+                    importance = it.chain.from_iterable(
+                        executor.map(_quantify_pairs_from_file, it.repeat(forest_file), chunks))
+
+                for (i, j), (mean, std) in zip(pairs_, importance):
+                    res[(f.cs.get_hyperparameter_by_idx(i), f.cs.get_hyperparameter_by_idx(j))] = {
+                        'mean': mean, 'std': std
+                    }
+
+            if not prune:
+                quantify(pairs)
+            elif step is not None and step not in (SOURCE, SINK):
+                # Only rows containing a hyperparameter of the selected step are returned
+                active = {i for i in indices if X.columns[i].startswith(step)}
+                quantify([(i, j) for i, j in pairs if i in active or j in active])
+            else:
+                HPImportance._quantify_top_k(pairs, individual, n_head, quantify, res,
+                                             batch_size=1 if executor is None else 4 * n_workers)
+
         df = pd.DataFrame(res).T.round(NUMBER_PRECISION)
         df = df.sort_values('mean', ascending=False)
 
@@ -67,108 +281,135 @@ class HPImportance:
         df['idx'] = range(0, df.shape[0])
         return df
 
+    @staticmethod
+    def _quantify_top_k(pairs: List[Tuple[int, int]], individual: Dict[int, Tuple[float, float]], k: int,
+                        quantify: Callable[[List[Tuple[int, int]]], None], res: Dict, batch_size: int = 1):
+        # The importance of all subsets of hyperparameters sums up to 1. Consequently, the interaction effect of a pair
+        # is bounded by the variance not explained by single hyperparameters
+        remaining = max(0., 1 - sum(mean for mean, _ in individual.values()))
+        bounds = {(i, j): individual[i][0] + individual[j][0] + remaining for i, j in pairs}
+        pairs = sorted(pairs, key=lambda pair: bounds[pair], reverse=True)
+
+        for start in range(0, len(pairs), batch_size):
+            top_k = heapq.nlargest(k, (v['mean'] for v in res.values()))
+            if len(top_k) == k and bounds[pairs[start]] < top_k[-1]:
+                # No remaining pair can enter the top k
+                break
+            quantify(pairs[start:start + batch_size])
+
     @staticmethod
     def calculate_fanova_details(f: fANOVA, X: pd.DataFrame, resolution: int = 20, hps: List[Tuple[str, str]] = None):
-        with tempfile.TemporaryDirectory() as tmp:
-            vis = visualizer.Visualizer(f, f.cs, tmp)
+        engine = MarginalEngine.of(f)
 
-            if hps is None:
-                keys = list(zip(range(len(X.columns)), range(len(X.columns)))) + list(
-                    it.combinations(range(len(X.columns)), 2))
-            else:
-                keys = list(map(lambda t: (f.cs.get_idx_by_hyperparameter_name(t[0]),
-                                           f.cs.get_idx_by_hyperparameter_name(t[1])), hps))
+        if hps is None:
+            keys = list(zip(range(len(X.columns)), range(len(X.columns)))) + list(
+                it.combinations(range(len(X.columns)), 2))
+        else:
+            keys = list(map(lambda t: (f.cs.get_idx_by_hyperparameter_name(t[0]),
+                                       f.cs.get_idx_by_hyperparameter_name(t[1])), hps))
 
-            res: Dict[int, Dict[int, Dict]] = defaultdict(dict)
-            for i, j in keys:
-                i_name = f.cs.get_hyperparameter_by_idx(i)
-                j_name = f.cs.get_hyperparameter_by_idx(j)
+        res: Dict[int, Dict[int, Dict]] = defaultdict(dict)
+        for i, j in keys:
+            i_name = f.cs.get_hyperparameter_by_idx(i)
+            j_name = f.cs.get_hyperparameter_by_idx(j)
 
-                if i == j:
-                    res[i_name][j_name] = HPImportance._get_plot_data(vis, i, resolution=resolution)
-                else:
-                    res[i_name][j_name] = HPImportance._get_pairwise_plot_data(vis, (i, j), resolution=resolution)
-                    res[j_name][i_name] = res[i_name][j_name]
-            return res
+            if i == j:
+                res[i_name][j_name] = HPImportance._get_plot_data(engine, i, resolution=resolution)
+            else:
+                res[i_name][j_name] = HPImportance._get_pairwise_plot_data(engine, (i, j), resolution=resolution)
+                res[j_name][i_name] = res[i_name][j_name]
+        return res
+
+    @staticmethod
+    def details_as_dataframe(details: Dict) -> pd.DataFrame:
+        """
+        Converts the array-based plot data of a single or pair of hyperparameters into a DataFrame. The DataFrames have
+        the same layout as the former record-based plot data:
+        - heatmap: one row per value of the first and one column per value of the second hyperparameter
+        - categorical and numerical hyperparameter: column x and one column per category
+        - single numerical hyperparameter: columns x, y and area with the tuple (mean + std, mean - std)
+        - single categorical hyperparameter: one column per label with the values [mean - std, mean + std]
+        """
+        if details['mode'] == 'heatmap':
+            return pd.DataFrame(np.array(details['z']), index=details['x'], columns=details['y'])
+        elif 'labels' in details and 'z' in details:
+            return pd.DataFrame(np.vstack((details['x'], details['z'])).T, columns=['x'] + details['labels'])
+        elif details['mode'] == 'continuous':
+            mean, std = np.array(details['y']), np.array(details['std'])
+            df = pd.DataFrame(np.stack((details['x'], mean, mean + std, mean - std)).T,
+                              columns=['x', 'y', 'lower', 'upper']).round(NUMBER_PRECISION)
+            df['area'] = list(zip(df['lower'], df['upper']))
+            return df[['x', 'y', 'area']]
+        else:
+            return pd.DataFrame({
+                label: [round(m - s, NUMBER_PRECISION), round(m + s, NUMBER_PRECISION)]
+                for m, s, label in zip(details['y'], details['std'], details['labels'])
+            })
 
     @staticmethod
     def simulate_surrogate(f: fANOVA, X: pd.DataFrame, resolution: int = 10) -> Dict:
-        with tempfile.TemporaryDirectory() as tmp:
-            vis = visualizer.Visualizer(f, f.cs, tmp)
-
-            res = {}
-            for i in range(len(X.columns)):
-                data = HPImportance._get_plot_data(vis, i, resolution=resolution)
-                name, mode, data = data['name'][0], data['mode'], data['data']
-
-                res[name] = {}
-                if mode == 'continuous':
-                    res[name]['simulated'] = [[d['x'], d['y']] for d in data]
-                elif mode == 'discrete':
-                    res[name]['simulated'] = [[i, d[0]] for i, d in enumerate(data.values())]
-                else:
-                    raise ValueError('Unknown mode {}'.format(mode))
+        engine = MarginalEngine.of(f)
 
-            return res
+        res = {}
+        for i in range(len(X.columns)):
+            name = f.cs.get_hyperparameter_by_idx(i)
+            grid, mean, std = engine.marginal(i, resolution)
 
-    @staticmethod
-    def _get_plot_data(vis: visualizer.Visualizer,
-                       idx: int,
-                       resolution: int = 10) -> Dict:
-        name = vis.cs.get_hyperparameter_names()[idx]
-        hp = vis.cs.get_hyperparameter(name)
+            if engine.is_numerical(i):
+                simulated = np.stack((np.round(grid, NUMBER_PRECISION), np.round(mean, NUMBER_PRECISION)), axis=1)
+            else:
+                # Discrete hyperparameters report the lower bound of the marginal, as the plot data always did
+                simulated = np.stack((np.arange(len(mean)), np.round(mean - std, NUMBER_PRECISION)), axis=1)
+            res[name] = {'simulated': simulated.tolist()}
 
-        if isinstance(hp, NumericalHyperparameter):
-            mean, std, grid = vis.generate_marginal(idx, resolution)
+        return res
 
-            df = pd.DataFrame(np.stack((grid, mean, mean + std, mean - std)).T, columns=['x', 'y', 'lower', 'upper']) \
-                .round(NUMBER_PRECISION)
-            df['area'] = list(zip(df['lower'], df['upper']))
+    @staticmethod
+    def _get_plot_data(engine: MarginalEngine, idx: int, resolution: int = 10) -> Dict:
+        name = engine.hps[idx].name
+        grid, mean, std = engine.marginal(idx, resolution)
+
+        if engine.is_numerical(idx):
             return {
                 'name': [name],
-                'data': df[['x', 'y', 'area']].to_dict('records'),
-                'mode': 'continuous'
+                'mode': 'continuous',
+                'x': np.round(grid, NUMBER_PRECISION).tolist(),
+                'y': np.round(mean, NUMBER_PRECISION).tolist(),
+                'std': np.round(std, NUMBER_PRECISION).tolist()
             }
         else:
-            if isinstance(hp, CategoricalHyperparameter):
-                labels = hp.choices
-            elif isinstance(hp, OrdinalHyperparameter):
-                labels = hp.sequence
-            else:
-                raise ValueError("Parameter {} of type {} not supported.".format(hp.name, type(hp)))
-
-            mean, std = vis.generate_marginal(idx)
-            d = {}
-            for m, s, l in zip(mean, std, labels):
-                d[l] = [round(m - s, NUMBER_PRECISION), round(m + s, NUMBER_PRECISION)]
-            return {'name': [name], 'data': d, 'mode': 'discrete'}
+            return {
+                'name': [name],
+                'mode': 'discrete',
+                'labels': engine.labels(idx),
+                'y': np.round(mean, NUMBER_PRECISION).tolist(),
+                'std': np.round(std, NUMBER_PRECISION).tolist()
+            }
 
     @staticmethod
-    def _get_pairwise_plot_data(vis: visualizer.Visualizer, idx: (int, int), resolution: int = 10) -> Dict:
-        name1 = vis.cs.get_hyperparameter_names()[idx[0]]
-        hp1 = vis.cs.get_hyperparameter(name1)
-
-        name2 = vis.cs.get_hyperparameter_names()[idx[1]]
-        hp2 = vis.cs.get_hyperparameter(name2)
-
-        if isinstance(hp1, NumericalHyperparameter) and isinstance(hp2, NumericalHyperparameter):
-            [x, y], z = vis.generate_pairwise_marginal(idx, resolution)
-            df = pd.DataFrame(z, columns=np.round(y, decimals=NUMBER_PRECISION),
-                              index=np.round(x, decimals=NUMBER_PRECISION))
-            return {'name': [name1, name2], 'data': df.round(NUMBER_PRECISION).to_dict(), 'mode': 'heatmap'}
-        elif isinstance(hp1, NumericalHyperparameter) or isinstance(hp2, NumericalHyperparameter):
+    def _get_pairwise_plot_data(engine: MarginalEngine, idx: Tuple[int, int], resolution: int = 10) -> Dict:
+        if engine.is_numerical(idx[0]) != engine.is_numerical(idx[1]):
             # Ensure that categorical parameter is always the first index
-            if isinstance(hp1, NumericalHyperparameter):
-                idx = list(reversed(idx))
-                name1, name2 = name2, name1
+            if engine.is_numerical(idx[0]):
+                idx = (idx[1], idx[0])
 
-            [categories, x], y = vis.generate_pairwise_marginal(idx, resolution)
-            df = pd.DataFrame(np.vstack((x, y)).T, columns=['x'] + list(categories))
-            return {'name': [name1, name2], 'data': df.round(NUMBER_PRECISION).to_dict('records'), 'mode': 'continuous'}
+            _, x, z = engine.pairwise_marginal(idx, resolution)
+            return {
+                'name': [engine.hps[idx[0]].name, engine.hps[idx[1]].name],
+                'mode': 'continuous',
+                'labels': engine.labels(idx[0]),
+                'x': np.round(x, NUMBER_PRECISION).tolist(),
+                'z': np.round(z, NUMBER_PRECISION).tolist()
+            }
         else:
-            [cat1, cat2], z = vis.generate_pairwise_marginal(idx)
-            df = pd.DataFrame(z, columns=cat2, index=cat1)
-            return {'name': [name1, name2], 'data': df.round(NUMBER_PRECISION).to_dict(), 'mode': 'heatmap'}
+            x, y, z = engine.pairwise_marginal(idx, resolution)
+            return {
+                'name': [engine.hps[idx[0]].name, engine.hps[idx[1]].name],
+                'mode': 'heatmap',
+                'x': np.round(x, NUMBER_PRECISION).tolist() if engine.is_numerical(idx[0]) else engine.labels(idx[0]),
+                'y': np.round(y, NUMBER_PRECISION).tolist() if engine.is_numerical(idx[1]) else engine.labels(idx[1]),
+                'z': np.round(z, NUMBER_PRECISION).tolist()
+            }
 
     @staticmethod
     def construct_fanova(cs: ConfigurationSpace, configs: List[Configuration], performances: np.ndarray):
@@ -1,26 +1,36 @@
+import multiprocessing
+import os
+import queue
 import time
 import warnings
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
+from multiprocessing.pool import AsyncResult
+from threading import Event, Lock
 from typing import Optional, List, Tuple, Dict, Set
 
 import numpy as np
 import pandas as pd
-from ConfigSpace import Configuration
+from ConfigSpace import Configuration, ConfigurationSpace
+from fanova import fANOVA
 from IPython.display import JSON
 from sklearn.pipeline import Pipeline
 
 from xautoml._helper import XAutoMLManager
-from xautoml.config_similarity import ConfigSimilarity
+from xautoml.config_similarity import ConfigSimilarity, ConfigEmbedding
 from xautoml.ensemble import EnsembleInspection
 from xautoml.graph_similarity import pipeline_to_networkx, GraphMatching, export_json
-from xautoml.hp_importance import HPImportance
+from xautoml.hp_importance import HPImportance, FanovaCache, ForestNotReady
 from xautoml.model_details import ModelDetails, DecisionTreeResult, LimeResult, GlobalSurrogateResult
-from xautoml.models import RunHistory, CandidateId, CandidateStructure, ML_KEYS, DOMAIN_KEYS, ROOT_KEYS, CANDIDATE_KEYS
-from xautoml.output import DESCRIPTION, OutputCalculator, COMPLETE
+from xautoml.models import RunHistory, Candidate, CandidateId, CandidateStructure, ML_KEYS, DOMAIN_KEYS, ROOT_KEYS, CANDIDATE_KEYS
+from xautoml.output import DESCRIPTION, OutputCalculator, COMPLETE, StepOutputStore, StepOutputs
 from xautoml.roc_auc import RocCurve
 from xautoml.util import pipeline_utils
+from xautoml.util.cache import ResultCache, fingerprint
 from xautoml.util.constants import SINK
 from xautoml.util.datasets import down_sample
+from xautoml.util.prediction_store import PredictionStore, Predictions
 
 
 def as_json(func):
@@ -39,9 +49,57 @@ def no_warnings(func):
     return wrapper
 
 
+_MISSING = object()
+
+
+def cached(func):
+    def wrapper(self, *args, **kwargs):
+        key = self._result_cache.key(self._fingerprint, func.__name__, args, sorted(kwargs.items()))
+        # Single lookup with a sentinel. Cached results may be None and unreadable files are reported as a miss
+        result = self._result_cache.get(key, _MISSING)
+        if result is not _MISSING:
+            return result
+
+        result = func(self, *args, **kwargs)
+        self._result_cache.put(key, result)
+        return result
+
+    return wrapper
+
+
+_worker_X: Optional[pd.DataFrame] = None
+_worker_started: Optional[multiprocessing.Queue] = None
+
+
+def _init_prediction_worker(X: pd.DataFrame, started: multiprocessing.Queue):
+    global _worker_X, _worker_started
+    _worker_X = X
+    _worker_started = started
+
+
+def _evaluate_model(idx: int, model: Pipeline) -> Optional[Predictions]:
+    # Report the start of the task to allow measuring the timeout per task instead of from submission
+    _worker_started.put((idx, time.time()))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return PredictionStore.evaluate(model, _worker_X)
+    except Exception:
+        return None
+
+
+def _shutdown_executors(executors: List[Optional[Executor]]):
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
 class XAutoML:
 
-    def __init__(self, run_history: RunHistory, X: pd.DataFrame, y: pd.Series, n_samples: int = 5000):
+    def __init__(self, run_history: RunHistory, X: pd.DataFrame, y: pd.Series, n_samples: int = 5000,
+                 cache_size: int = 128, cache_dir: Optional[str] = None, prediction_time: str = 'eager',
+                 prediction_timeout: float = 1000, surrogate_checkpoints: int = 10, n_jobs: int = 1,
+                 page_size: Optional[int] = 1000, max_output_memory: int = 512 * 1024 ** 2):
         """
         Main class for visualizing AutoML optimization procedures in XAutoML. This class provides methods to render
         the visualization, provides endpoints for internal communication, and for exporting data to Jupyter.
@@ -52,7 +110,32 @@ class XAutoML:
         :param y: Series containing the test data set. Used for all calculations
         :param n_samples: Maximum number of samples in the test data set. Due to the interactive nature of XAutoML,
         calculations have to be quite fast. By default, the number of samples is limited to 5000
-        """
+        :param cache_size: Maximum number of endpoint results kept in memory
+        :param cache_dir: Optional directory to persist endpoint results. Results stored in this directory are reused
+        when the same run history is analysed with the same data set again, e.g., after a kernel restart. Class
+        probabilities of all candidates are memory-mapped from this directory. Without it, only the probabilities of
+        the 32 most recently used candidates are kept in memory
+        :param prediction_time: Strategy for measuring the prediction time of all candidates. 'eager' measures all
+        candidates sequentially during construction, 'lazy' defers the measurement until the leaderboard is rendered
+        for the first time, and 'parallel' measures all candidates during construction using a process pool. The
+        prediction time is the duration of `predict` on the test data set. Class probabilities are only computed once
+        they are needed
+        :param prediction_timeout: Maximum time in seconds a single candidate may take for its evaluation in 'parallel'
+        mode, measured from the start of its evaluation. Hung workers are terminated. Candidates that timed out or
+        failed to predict are reported with this prediction time
+        :param surrogate_checkpoints: Number of checkpoints along the optimization run for which the simulated
+        surrogate models are trained in the background. Requests for the surrogate at a given timestamp are answered
+        from the latest checkpoint before this timestamp. If no checkpoint is available yet, the surrogate is trained in
+        the background for the requested timestamp. 0 disables the checkpoints
+        :param n_jobs: Number of processes used for parallel computations. -1 uses all available cores
+        :param page_size: Maximum number of candidates embedded directly in the visualization. Larger run histories
+        are transferred page-wise with page_size candidates per page. None always embeds the complete run history
+        :param max_output_memory: Maximum memory in bytes used for storing the intermediate outputs of candidates. The
+        intermediate outputs are shared by all step-specific endpoints of a candidate
+        """
+        if prediction_time not in ('eager', 'lazy', 'parallel'):
+            raise ValueError(f'Unknown prediction_time {prediction_time}. Expected one of eager, lazy or parallel')
+
         self.run_history = run_history
 
         if X.shape[0] > n_samples:
@@ -63,33 +146,163 @@ class XAutoML:
             X, y = down_sample(X, y, n_samples)
         self.X: pd.DataFrame = X.reset_index(drop=True)
         self.y: pd.Series = y.reset_index(drop=True)
-        self._calc_pred_times()
+        self.prediction_timeout = prediction_timeout
+        self.n_jobs = n_jobs
+        self.page_size = page_size
+
+        self._step_outputs = StepOutputStore(max_output_memory)
+        self._config_embedding = ConfigEmbedding()
+        # Besides the checkpoints, one forest per structure is trained on all configurations. Forests requested for
+        # timestamps before the first checkpoint are kept separately, so that they never evict the checkpoints
+        self._fanova_cache = FanovaCache(max_forests=surrogate_checkpoints + 2)
+        self._adhoc_fanova_cache = FanovaCache(max_forests=2)
+        self.surrogate_checkpoints = surrogate_checkpoints
+        self._pending_checkpoints: Set[Tuple[int, int]] = set()
+        self._failed_checkpoints: Dict[Tuple[int, int], Exception] = {}
+        self._checkpoint_lock = Lock()
+        self._checkpoint_executor = ThreadPoolExecutor(max_workers=1)
+        # Worker processes are shared by all requests. They are only started on first use
+        self._process_pool = ProcessPoolExecutor(max_workers=None if n_jobs < 0 else n_jobs) if n_jobs != 1 else None
+        self._finalizer = weakref.finalize(self, _shutdown_executors, [self._checkpoint_executor, self._process_pool])
+        self._result_cache = ResultCache(cache_size, cache_dir)
+        self._fingerprint = fingerprint(self.X, self.y, run_history.meta.framework, run_history.meta.start_time,
+                                        run_history.meta.n_configs)
+        self._predictions = PredictionStore(
+            self.X, self._stored_model,
+            os.path.join(cache_dir, 'predictions', self._fingerprint) if cache_dir is not None else None
+        )
+
+        self._pred_times_calculated = False
+        if prediction_time == 'eager':
+            self._calc_pred_times()
+        elif prediction_time == 'parallel':
+            self._calc_pred_times_parallel()
 
         XAutoMLManager.open(self)
 
+    def close(self):
+        """
+        Stops all worker processes and background threads. Called automatically when this instance is garbage collected
+        """
+        self._finalizer()
+
     # Helper Methods
 
+    def _missing_pred_times(self) -> List[Candidate]:
+        return [c for c in self.run_history.cid_to_candidate.values() if 'prediction_time' not in c.runtime]
+
     @no_warnings
     def _calc_pred_times(self):
-        for candidate in self.run_history.cid_to_candidate.values():
-            if 'prediction_time' in candidate.runtime:
-                continue
-
+        for candidate in self._missing_pred_times():
             try:
-                start = time.time()
-                candidate.model.predict(self.X)
-                end = time.time()
-                candidate.runtime['prediction_time'] = end - start
+                duration = self._predictions.duration(candidate.id)
             except Exception:
-                candidate.runtime['prediction_time'] = 1000
+                duration = self.prediction_timeout
+            candidate.runtime['prediction_time'] = duration
+        self._pred_times_calculated = True
+
+    def _calc_pred_times_parallel(self):
+        remaining = []
+        for candidate in self._missing_pred_times():
+            if candidate.id in self._predictions:
+                candidate.runtime['prediction_time'] = self._predictions.duration(candidate.id)
+            else:
+                remaining.append(candidate)
+
+        while len(remaining) > 0:
+            finished = self._evaluate_parallel(remaining)
+            if len(finished) == 0:
+                # Workers crashed before reporting any evaluation. Do not retry forever
+                for candidate in remaining:
+                    candidate.runtime['prediction_time'] = self.prediction_timeout
+                break
+            remaining = [c for c in remaining if c.id not in finished]
+        self._pred_times_calculated = True
+
+    def _evaluate_parallel(self, candidates: List[Candidate]) -> Set[CandidateId]:
+        """
+        Evaluates the given candidates in worker processes. Each evaluation is limited to prediction_timeout seconds
+        measured from the start of the evaluation. If an evaluation exceeds this limit, all workers are terminated as
+        hung processes can not be stopped otherwise. Evaluations aborted by this are not finished and have to be
+        submitted again. Models are loaded and transferred in waves, so that only about twice as many models as
+        workers are held in memory at the same time.
+        :return: ids of all candidates with a finished measurement
+        """
+        n_workers = os.cpu_count() if self.n_jobs < 0 else self.n_jobs
+        started_queue = multiprocessing.Queue()
+        completed = Event()
+        # Test data is transferred only once to each worker
+        pool = multiprocessing.Pool(n_workers, initializer=_init_prediction_worker, initargs=(self.X, started_queue))
+
+        waiting = iter(range(len(candidates)))
+        results: Dict[int, AsyncResult] = {}
+        finished = set()
+        started: Dict[int, float] = {}
+        terminated = False
+        try:
+            while True:
+                while len(results) < 2 * n_workers:
+                    idx = next(waiting, None)
+                    if idx is None:
+                        break
+                    results[idx] = pool.apply_async(_evaluate_model, (idx, candidates[idx].model),
+                                                    callback=lambda _: completed.set(),
+                                                    error_callback=lambda _: completed.set())
+                if len(results) == 0:
+                    break
+
+                deadlines = [started[idx] + self.prediction_timeout for idx in results if idx in started]
+                timeout = max(min(deadlines) - time.time(), 0) if len(deadlines) > 0 else 1
+                completed.wait(min(timeout, 1))
+                completed.clear()
+                try:
+                    while True:
+                        idx, start = started_queue.get_nowait()
+                        started[idx] = start
+                except queue.Empty:
+                    pass
+
+                for idx in [idx for idx, result in results.items() if result.ready()]:
+                    candidate = candidates[idx]
+                    try:
+                        predictions = results.pop(idx).get()
+                    except Exception:
+                        predictions = None
+
+                    if predictions is not None:
+                        # Predictions computed by the workers are reused by all other endpoints
+                        self._predictions.add(candidate.id, *predictions)
+                        candidate.runtime['prediction_time'] = predictions[1]
+                    else:
+                        candidate.runtime['prediction_time'] = self.prediction_timeout
+                    finished.add(candidate.id)
+
+                # Tasks of crashed workers never complete and are also stopped by their deadline
+                now = time.time()
+                expired = [idx for idx in results if idx in started and now - started[idx] >= self.prediction_timeout]
+                if len(expired) > 0:
+                    for idx in expired:
+                        candidates[idx].runtime['prediction_time'] = self.prediction_timeout
+                        finished.add(candidates[idx].id)
+                    terminated = True
+                    break
+        finally:
+            if terminated or len(results) > 0:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+
+        return finished
 
     def _load_models(self, cids: List[CandidateId]) -> Tuple[pd.DataFrame, pd.Series, List[Pipeline]]:
-        models = []
-        for cid in cids:
-            if cid == 'ENSEMBLE':
-                models.append(deepcopy(self.run_history.ensemble.candidate.model))
-            else:
-                models.append(deepcopy(self.run_history.cid_to_candidate[cid].model))
+        """
+        Load the fitted models of the given candidates. The stored models are returned without copying them. Callers
+        must treat those models as read-only. Functions deriving a modified pipeline, like get_subpipeline, have to
+        create new objects instead of altering the stored model. The data set is copied, as fitted models may modify
+        their input in place.
+        """
+        models = [self._stored_model(cid) for cid in cids]
 
         return self.X.copy(), self.y.copy(), [m for m in models if m is not None]
 
@@ -101,37 +314,92 @@ class XAutoML:
         pipeline = models[0]
         return X, y, pipeline
 
-    @staticmethod
-    def _get_intermediate_output(X, y, model, method):
-        df_handler = OutputCalculator()
-        _, outputs = df_handler.calculate_outputs(model, X, y, method=method)
-        return outputs
+    def _stored_model(self, cid: CandidateId) -> Optional[Pipeline]:
+        if cid == 'ENSEMBLE':
+            return self.run_history.ensemble.candidate.model
+        return self.run_history.cid_to_candidate[cid].model
 
-    def _calculate_output(self, cid: CandidateId, method: str):
+    def _performance(self, cid: CandidateId):
+        metric = self.run_history.meta.metric
+        y_pred = self._predictions.predict(cid)
+        y_prob = self._predictions.predict_proba(cid) if metric == 'roc_auc' else None
+        return ModelDetails.performance_from_predictions(self.y, y_pred, y_prob, self._predictions.duration(cid),
+                                                         metric)
+
+    def _member_predictions(self, members: List[Candidate]) -> np.ndarray:
+        return np.array([c.y_transformer(self._predictions.predict(c.id)) for c in members])
+
+    def _get_step_outputs(self, cid: CandidateId) -> StepOutputs:
+        # Captured on the stored model, the same object all sub-pipelines are derived from
         X, y, pipeline = self._load_model(cid)
-        steps = self._get_intermediate_output(X, y, pipeline, method=method)
-        return steps
+        return self._step_outputs.get(cid, lambda: OutputCalculator.capture_outputs(pipeline, X))
+
+    def _calculate_output(self, cid: CandidateId, method: str):
+        _, y, _ = self._load_model(cid)
+        _, outputs = OutputCalculator.format_outputs(self._get_step_outputs(cid), y, method=method)
+        return outputs
 
     def _get_equivalent_configs(self,
                                 structure: Optional[CandidateStructure],
                                 timestamp: float = np.inf) -> Tuple[List[Configuration], np.ndarray]:
-        configs = []
-        loss = []
+        table = self.run_history.candidates
         hash_ = structure.hash if structure is not None else hash(str(None))
 
-        # join equivalent structures
-        for s in self.run_history.structures:
-            if s.hash == hash_:
-                configs += [c.config for c in s.configs if c.runtime['timestamp'] < timestamp]
-                loss += [c.loss for c in s.configs if c.runtime['timestamp'] < timestamp]
-        return configs, np.array(loss)
+        # join equivalent structures. Sorted chronologically, so that the configurations up to any timestamp are a
+        # prefix of all configurations
+        idx = table.equivalent_rows(hash_, timestamp)
+        return [table.candidates[i].config for i in idx], table.loss[idx]
+
+    def _get_fanova(self, hash_: int, cs: ConfigurationSpace, configs: List[Configuration],
+                    loss: np.ndarray, cache: Optional[FanovaCache] = None) -> Tuple[fANOVA, pd.DataFrame]:
+        # Forests are identified by the structure and the number of chronologically sorted configurations. Forests
+        # for all configurations are reused by all hp importance endpoints until new configurations arrive, forests for
+        # fewer configurations serve as checkpoints for the surrogate simulation
+        cache = cache if cache is not None else self._fanova_cache
+        cached = cache.get(hash_, len(configs))
+        if cached is not None:
+            return cached
+
+        f, X = HPImportance.construct_fanova(cs, configs, loss)
+        cache.put(hash_, len(configs), (f, X))
+        return f, X
+
+    def _schedule_checkpoints(self, hash_: int, cs: ConfigurationSpace, configs: List[Configuration],
+                              loss: np.ndarray, counts: Optional[List[int]] = None, cache: Optional[FanovaCache] = None):
+        """
+        Trains the forests for the first n configurations for all given counts in the background. By default,
+        surrogate_checkpoints counts are distributed evenly over all configurations. Counts whose training failed are
+        not scheduled again
+        """
+        cache = cache if cache is not None else self._fanova_cache
+        if counts is None:
+            if self.surrogate_checkpoints <= 0:
+                return
+            counts = np.unique(np.linspace(0, len(configs), self.surrogate_checkpoints + 1)[1:].astype(int)).tolist()
+
+        for n in counts:
+            key = (hash_, n)
+            with self._checkpoint_lock:
+                if n < 2 or key in self._pending_checkpoints or key in self._failed_checkpoints or \
+                        cache.get(*key) is not None:
+                    continue
+                self._pending_checkpoints.add(key)
+            self._checkpoint_executor.submit(self._train_checkpoint, hash_, cs, configs[:n], loss[:n], cache)
+
+    def _train_checkpoint(self, hash_: int, cs: ConfigurationSpace, configs: List[Configuration], loss: np.ndarray,
+                          cache: FanovaCache):
+        try:
+            self._get_fanova(hash_, cs, configs, loss, cache)
+        except Exception as ex:
+            # Reported by _simulate_surrogate instead of letting the client wait for a forest that never arrives
+            with self._checkpoint_lock:
+                self._failed_checkpoints[(hash_, len(configs))] = ex
+        finally:
+            with self._checkpoint_lock:
+                self._pending_checkpoints.discard((hash_, len(configs)))
 
     def _construct_fanova(self, sid: Optional[str]):
-        if sid is not None:
-            matches = filter(lambda s: s.cid == sid, self.run_history.structures)
-            structure = next(matches)
-        else:
-            structure = None
+        structure = self.run_history.cid_to_structure[sid] if sid is not None else None
 
         actual_cs = None
         configs, loss = self._get_equivalent_configs(structure)
@@ -145,7 +413,8 @@ class XAutoML:
             except AttributeError:
                 pass
 
-        f, X = HPImportance.construct_fanova(cs, configs, loss)
+        hash_ = structure.hash if structure is not None else hash(str(None))
+        f, X = self._get_fanova(hash_, cs, configs, loss)
         if X.shape[0] < 2:
             raise ValueError('Not enough evaluated configurations to calculate hyperparameter importance.')
 
@@ -154,22 +423,27 @@ class XAutoML:
     # Endpoints for internal communication
 
     @as_json
+    @cached
     def _output_description(self, cid: CandidateId):
         with pd.option_context('display.max_columns', 30, 'display.max_rows', 10):
             return self._calculate_output(cid, DESCRIPTION)
 
     @as_json
+    @cached
     def _output_complete(self, cid: CandidateId):
         with pd.option_context('display.max_columns', 1024, 'display.max_rows', 30, 'display.min_rows', 20):
             return self._calculate_output(cid, COMPLETE)
 
     @as_json
-    def _performance_data(self, cid: CandidateId):
-        X, y, pipeline = self._load_model(cid)
-        details = ModelDetails()
+    def _output_rows(self, cid: CandidateId, step: str, offset: int = 0, limit: int = 30, sort_by: Optional[str] = None,
+                     ascending: bool = True):
+        _, y, _ = self._load_model(cid)
+        return OutputCalculator.row_window(self._get_step_outputs(cid), y, step, offset, limit, sort_by, ascending)
 
-        duration, val_score, report, accuracy, cm = details.calculate_performance_data(X, y, pipeline,
-                                                                                       self.run_history.meta.metric)
+    @as_json
+    @cached
+    def _performance_data(self, cid: CandidateId):
+        duration, val_score, report, accuracy, cm = self._performance(cid)
         return {
             'duration': duration,
             'val_score': float(val_score),
@@ -179,6 +453,7 @@ class XAutoML:
         }
 
     @as_json
+    @cached
     def _decision_tree_surrogate(self, cid: CandidateId, step: str, max_leaf_nodes: Optional[int]):
         X, y, pipeline = self._load_model(cid)
 
@@ -187,13 +462,15 @@ class XAutoML:
             res = GlobalSurrogateResult([DecisionTreeResult(pipeline_utils.Node('empty', 0, [], []), 0, 0, 2)] * 10, 0)
             additional_features = []
         else:
-            pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y)
+            pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y,
+                                                                              self._get_step_outputs(cid))
             details = ModelDetails()
             res = details.calculate_decision_tree(X, pipeline, max_leaf_nodes=max_leaf_nodes)
 
         return res.as_dict(additional_features)
 
     @as_json
+    @cached
     def _feature_importance(self, cid: CandidateId, step: str):
         X, y, pipeline = self._load_model(cid)
 
@@ -202,7 +479,8 @@ class XAutoML:
             res = pd.DataFrame()
             additional_features = []
         else:
-            pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y)
+            pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y,
+                                                                              self._get_step_outputs(cid))
             res = ModelDetails.calculate_feature_importance(X, y, pipeline, self.run_history.meta.metric)
 
         res['idx'] = range(len(res))
@@ -216,6 +494,7 @@ class XAutoML:
         }
 
     @as_json
+    @cached
     def _pdp(self, cid: CandidateId, step: str, features: List[str] = None):
         return self.pdp(cid, step, features)
 
@@ -223,7 +502,9 @@ class XAutoML:
     def _fanova_overview(self, sid: Optional[CandidateId], step: str):
         try:
             f, X, actual_cs = self._construct_fanova(sid)
-            overview = HPImportance.calculate_fanova_overview(f, X, step=step, filter_=actual_cs)
+            overview = HPImportance.calculate_fanova_overview(f, X, step=step, filter_=actual_cs, n_jobs=self.n_jobs,
+                                                              min_importance=0.01, prune=True,
+                                                              executor=self._process_pool)
             overview = {
                 'column_names': np.unique(np.array(overview.index.to_list()).flatten()).tolist(),
                 'keys': overview.index.tolist(),
@@ -244,44 +525,55 @@ class XAutoML:
     @as_json
     def _simulate_surrogate(self, sid: CandidateId, timestamp: float):
         try:
-            matches = filter(lambda s: s.cid == sid, self.run_history.structures)
-            structure = next(matches)
-
-            cs = structure.configspace if structure.configspace is not None else self.run_history.default_configspace
-            configs, loss = self._get_equivalent_configs(structure, timestamp)
+            structure = self.run_history.cid_to_structure[sid]
+        except KeyError:
+            raise ValueError('Unknown structure {}'.format(sid))
 
-            f, X = HPImportance.construct_fanova(cs, configs, loss)
-            explanations = HPImportance.simulate_surrogate(f, X)
-            return explanations
-        except IndexError:
+        cs = structure.configspace if structure.configspace is not None else self.run_history.default_configspace
+        configs, loss = self._get_equivalent_configs(structure)
+        n = len(self._get_equivalent_configs(structure, timestamp)[0])
+        if n < 2:
             raise ValueError('Unable to simulate surrogate model without trainings data')
+        self._schedule_checkpoints(structure.hash, cs, configs, loss)
+
+        # Answer from the latest available forest that does not contain configurations sampled after timestamp.
+        # Forests are never trained while answering a request
+        available = sorted(((count, cache) for cache in (self._fanova_cache, self._adhoc_fanova_cache)
+                            for count in cache.counts(structure.hash) if count <= n),
+                           key=lambda t: t[0], reverse=True)
+        for count, cache in available:
+            cached = cache.get(structure.hash, count)
+            if cached is not None:
+                return HPImportance.simulate_surrogate(*cached)
+
+        # No checkpoint precedes timestamp. Train the requested state as an additional forest
+        self._schedule_checkpoints(structure.hash, cs, configs, loss, [n], self._adhoc_fanova_cache)
+        with self._checkpoint_lock:
+            error = self._failed_checkpoints.get((structure.hash, n))
+        if error is not None:
+            raise error
+        raise ForestNotReady('Surrogate model for {} is still being trained'.format(sid))
 
     @as_json
     def _config_similarity(self):
-        configspaces = {}
-        configs = {}
-        loss = {}
-        for structure in self.run_history.structures:
-            if structure.hash not in configspaces:
-                configspaces[structure.hash] = structure.configspace
-                configs[structure.hash] = [c.config for c in structure.configs]
-                loss[structure.hash] = [c.loss for c in structure.configs]
-            else:
-                configs[structure.hash] += [c.config for c in structure.configs]
-                loss[structure.hash] += [c.loss for c in structure.configs]
-
         cs = []
         conf = []
         lo = []
-        for key in configspaces.keys():
-            cs.append(configspaces[key] if configspaces[key] is not None else self.run_history.default_configspace)
-            conf.append(configs[key])
-            lo += loss[key]
-
-        res = ConfigSimilarity.compute(cs, conf, np.array(lo), self.run_history.meta.is_minimization)
+        cids = []
+        for structures in self.run_history.hash_to_structures.values():
+            candidates = [c for structure in structures for c in structure.configs]
+            configspace = structures[0].configspace
+            cs.append(configspace if configspace is not None else self.run_history.default_configspace)
+            conf.append([c.config for c in candidates])
+            lo += [c.loss for c in candidates]
+            cids += [c.id for c in candidates]
+
+        res = ConfigSimilarity.compute(cs, conf, np.array(lo), self.run_history.meta.is_minimization,
+                                       n_jobs=self.n_jobs, cids=cids, embedding=self._config_embedding)
         return res
 
     @as_json
+    @cached
     def _lime(self, cid: CandidateId, idx: int, step: str):
         X, y, pipeline = self._load_model(cid)
 
@@ -289,7 +581,8 @@ class XAutoML:
             res = LimeResult(idx, {}, {}, getattr(y[idx], "tolist", lambda: y[idx])())
             additional_features = False
         else:
-            pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y)
+            pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y,
+                                                                              self._get_step_outputs(cid))
             details = ModelDetails()
             try:
                 res = details.calculate_lime(X, y, pipeline, idx)
@@ -299,17 +592,16 @@ class XAutoML:
         return res.to_dict(additional_features)
 
     @as_json
+    @cached
     def _roc_curve(self, cids: List[CandidateId], micro: bool = False, macro: bool = True, max_samples: int = 50,
                    max_curves: int = 20):
         pruned_cids = cids[:max_curves]
 
-        X, y, models = self._load_models(pruned_cids)
-
         result = {}
-        for cid, pipeline in zip(pruned_cids, models):
+        for cid in pruned_cids:
             try:
                 roc = RocCurve(micro=micro, macro=macro)
-                roc.score(pipeline, X, y)
+                roc.score_proba(self._predictions.predict_proba(cid), self.y)
 
                 # Transform into format suited for recharts
                 for fpr, tpr, label in roc.get_data(cid):
@@ -324,29 +616,32 @@ class XAutoML:
         return result
 
     @as_json
+    @cached
     def _ensemble_decision_surface(self):
         ensemble = self.run_history.ensemble
         if len(ensemble.members) == 0:
             return {}
 
         members = [self.run_history.cid_to_candidate[cid] for cid in ensemble.members]
-        X, y = self.data_set()
+        X, y = self.X.copy(), self.y.copy()
 
         return EnsembleInspection.plot_decision_surface(ensemble, members, X, y)
 
     @as_json
+    @cached
     def _ensemble_overview(self):
         ensemble = self.run_history.ensemble
         if len(ensemble.members) == 0:
             return {}
 
         members = [self.run_history.cid_to_candidate[cid] for cid in ensemble.members]
-        X, y = self.data_set()
+        X, y = self.X.copy(), self.y.copy()
 
-        y_pred = ensemble.model.predict(X)
-        confidence = ensemble.model.predict_proba(X)
+        y_pred = self._predictions.predict('ENSEMBLE')
+        confidence = self._predictions.predict_proba('ENSEMBLE')
 
-        metrics, idx = EnsembleInspection.ensemble_overview(ensemble, members, X, y_pred)
+        metrics, idx = EnsembleInspection.ensemble_overview(ensemble, members, X, y_pred,
+                                                            all_predictions=self._member_predictions(members))
 
         with pd.option_context('display.max_columns', 1024, 'display.max_rows', 30, 'display.min_rows', 20):
             df = OutputCalculator._load_data(X.loc[idx, :], y[idx], y_pred[idx], np.max(confidence[idx], axis=1),
@@ -354,30 +649,36 @@ class XAutoML:
             return {'df': df, 'metrics': metrics}
 
     @as_json
+    @cached
     def _ensemble_predictions(self, idx: int):
         ensemble = self.run_history.ensemble
         if len(ensemble.members) == 0:
             return {}
 
-        X, _ = self.data_set()
-        X = X.loc[[idx], :]
-
         members = [self.run_history.cid_to_candidate[cid] for cid in ensemble.members]
 
-        predictions = EnsembleInspection.member_predictions(members, X)
-        res = {cid: pred.tolist()[0] for cid, pred in zip(ensemble.members, predictions)}
-        res['Ensemble'] = ensemble.model.predict(X).tolist()[0]
+        predictions = self._member_predictions(members)
+        res = {cid: pred[[idx]].tolist()[0] for cid, pred in zip(ensemble.members, predictions)}
+        res['Ensemble'] = self._predictions.predict('ENSEMBLE')[[idx]].tolist()[0]
 
         return res
 
+    @as_json
+    def _run_history_page(self, page: int):
+        return self.run_history.page_as_dict(page, self.page_size, intern=True)
+
+    @as_json
+    def _explanations(self):
+        return self.run_history.explanations.as_dict()
+
     @as_json
     def _get_pipeline_history(self) -> Dict:
         candidates = []
         for struct in self.run_history.structures:
-            candidates += [(c.runtime['timestamp'], struct.pipeline, c.id) for c in struct.configs]
+            candidates += [(c.runtime['timestamp'], struct.pipeline, c.id, struct.hash) for c in struct.configs]
 
-        graphs = [pipeline_to_networkx(pipeline, cid) for _, pipeline, cid in candidates]
-        merged, history = GraphMatching.create_structure_history(graphs)
+        graphs = [pipeline_to_networkx(pipeline, cid) for _, pipeline, cid, _ in candidates]
+        merged, history = GraphMatching.create_structure_history(graphs, [hash_ for _, _, _, hash_ in candidates])
         return {'merged': history, 'individual': [export_json(g) for g in graphs]}
 
     # Endpoints for external communication
@@ -395,7 +696,8 @@ class XAutoML:
         :param cid: candidate id
         :return: tuple containing 1) The input data, 2) target values, and 3) fitted pipeline
         """
-        return self._load_model(cid)
+        X, y, pipeline = self._load_model(cid)
+        return X.copy(), y.copy(), deepcopy(pipeline)
 
     @no_warnings
     def sub_pipeline(self, cid: CandidateId, step: str) -> Tuple[pd.DataFrame, pd.Series, Pipeline]:
@@ -407,8 +709,8 @@ class XAutoML:
         and 3) new sub-pipeline starting after the provided step
         """
         X, y, pipeline = self._load_model(cid)
-        pipeline, X, _ = pipeline_utils.get_subpipeline(pipeline, step, X, y)
-        return X, y, pipeline
+        pipeline, X, _ = pipeline_utils.get_subpipeline(pipeline, step, X, y, self._get_step_outputs(cid))
+        return X.copy(), y.copy(), deepcopy(pipeline)
 
     @no_warnings
     def feature_importance(self, cid: CandidateId, step: str):
@@ -433,7 +735,8 @@ class XAutoML:
         """
         X, y, pipeline = self._load_model(cid)
 
-        pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y)
+        pipeline, X, additional_features = pipeline_utils.get_subpipeline(pipeline, step, X, y,
+                                                                          self._get_step_outputs(cid))
         return ModelDetails.calculate_pdp(X, y, pipeline, features=features)
 
     @no_warnings
@@ -458,7 +761,8 @@ class XAutoML:
         """
 
         f, X, actual_cs = self._construct_fanova(sid)
-        return HPImportance.calculate_fanova_overview(f, X, step=step, filter_=actual_cs, n_head=10000)
+        return HPImportance.calculate_fanova_overview(f, X, step=step, filter_=actual_cs, n_head=10000,
+                                                    n_jobs=self.n_jobs, min_importance=0, executor=self._process_pool)
 
     @no_warnings
     def hp_interactions(self, sid: Optional[str], step: str, hp1: str, hp2: str = None):
@@ -476,7 +780,8 @@ class XAutoML:
         if hp2 is None:
             hp2 = hp1
 
-        return pd.DataFrame(HPImportance.calculate_fanova_details(f, X, hps=[(hp1, hp2)])[hp1][hp2]['data'])
+        details = HPImportance.calculate_fanova_details(f, X, hps=[(hp1, hp2)])
+        return HPImportance.details_as_dataframe(details[hp1][hp2])
 
     @no_warnings
     def class_report(self, cid: str):
@@ -486,9 +791,7 @@ class XAutoML:
         :return: DataFrame with class report
         """
 
-        X, y, pipeline = self._load_model(cid)
-        details = ModelDetails()
-        _, _, report, _, _ = details.calculate_performance_data(X, y, pipeline, self.run_history.meta.metric)
+        _, _, report, _, _ = self._performance(cid)
         return pd.DataFrame(report)
 
     @no_warnings
@@ -499,9 +802,7 @@ class XAutoML:
         :return: DataFrame with confusion matrix
         """
 
-        X, y, pipeline = self._load_model(cid)
-        details = ModelDetails()
-        _, _, _, _, cm = details.calculate_performance_data(X, y, pipeline, self.run_history.meta.metric)
+        _, _, _, _, cm = self._performance(cid)
         return cm
 
     def config(self, cid: str):
@@ -514,6 +815,9 @@ class XAutoML:
         return self.run_history.cid_to_candidate.get(cid).config.get_dictionary()
 
     def _repr_mimebundle_(self, include, exclude):
+        if not self._pred_times_calculated:
+            self._calc_pred_times()
+
         entrypoint = getattr(self, '_entrypoint', 'root')
         kwargs = getattr(self, '_kwargs', {})
 
@@ -521,7 +825,7 @@ class XAutoML:
             'application/xautoml+json': {
                 'entrypoint': entrypoint,
                 'kwargs': kwargs,
-                'runhistory': self.run_history.as_dict()
+                'runhistory': self.run_history.as_dict(self.page_size, intern=True)
             }
         }
 
@@ -651,12 +955,9 @@ class XAutoML:
         if cid is not None:
             return cid
         if rank is not None:
-            keys = sorted(
-                self.run_history.cid_to_candidate,
-                key=lambda key: self.run_history.cid_to_candidate[key].loss,
-                reverse=not self.run_history.meta.is_minimization
-            )
-            return keys[rank]
+            table = self.run_history.candidates
+            order = np.argsort(table.loss if self.run_history.meta.is_minimization else -table.loss, kind='stable')
+            return table.ids[order[rank]]
         raise ValueError('Provide either cid or rank')
 
     @staticmethod
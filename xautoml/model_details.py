@@ -1,6 +1,6 @@
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional
 
 import numpy as np
 import pandas as pd
@@ -18,7 +18,7 @@ from sklearn.utils.fixes import delayed
 from sklearn.utils.multiclass import unique_labels, type_of_target
 
 from xautoml.util.constants import NUMBER_PRECISION
-from xautoml.util.pipeline_utils import export_tree, DataFrameImputer, Node, InplaceOrdinalEncoder
+from xautoml.util.pipeline_utils import export_tree, DataFrameImputer, Node, InplaceOrdinalEncoder, densify
 
 
 @dataclass
@@ -74,8 +74,13 @@ class ModelDetails:
         y_pred = model.predict(X)
         duration = time.time() - start
 
+        y_prob = model.predict_proba(X) if scoreing == 'roc_auc' else None
+        return ModelDetails.performance_from_predictions(y, y_pred, y_prob, duration, scoreing)
+
+    @staticmethod
+    def performance_from_predictions(y: pd.Series, y_pred: np.ndarray, y_prob: Optional[np.ndarray], duration: float,
+                                     scoreing: str):
         if scoreing == 'roc_auc':
-            y_prob = model.predict_proba(X)
             y_type = type_of_target(y)
             if y_type == "binary" and y_prob.ndim > 1:
                 y_prob = y_prob[:, 1]
@@ -111,6 +116,7 @@ class ModelDetails:
             inverted_input = pipeline.inverse_transform(X)
             return model.predict_proba(inverted_input)
 
+        df = densify(df)
         cat_columns = make_column_selector(dtype_exclude=np.number)(df)
         pipeline = Pipeline(steps=[
             ('imputation', DataFrameImputer()),
@@ -145,6 +151,7 @@ class ModelDetails:
 
     @staticmethod
     def calculate_decision_tree(df: pd.DataFrame, model, max_leaf_nodes: int = None) -> GlobalSurrogateResult:
+        df = densify(df)
         y_pred = model.predict(df)
 
         if max_leaf_nodes is not None:
@@ -1,6 +1,12 @@
+import json
+import os
+from collections import OrderedDict
 from dataclasses import dataclass, asdict
-from typing import Optional, Any, Callable, Dict, List, Tuple
+from functools import partial
+from threading import Lock
+from typing import Optional, Any, Callable, Dict, List, Tuple, Union
 
+import numpy as np
 from ConfigSpace import ConfigurationSpace, Configuration
 from ConfigSpace.read_and_write import json as config_json
 from sklearn.pipeline import Pipeline
@@ -16,6 +22,14 @@ DOMAIN_KEYS = {'candidate:domain:performance', 'candidate:domain:raw-dataset', '
 ML_KEYS = {'candidate:ml:configuration', 'candidate:ml:hp-importance'}
 
 
+def identity(y):
+    """
+    Default y_transformer of candidates whose predictions do not need to be transformed. In contrast to a lambda it
+    can be pickled
+    """
+    return y
+
+
 @dataclass()
 class MetaInformation:
     framework: str
@@ -31,6 +45,55 @@ class MetaInformation:
     config: Dict[str, Any]
 
 
+class ModelCache:
+
+    def __init__(self, max_size: int = 32):
+        """
+        Bounded LRU cache of fitted pipelines that are loaded lazily
+        :param max_size: Maximum number of resident pipelines
+        """
+        self.max_size = max_size
+        self._models: 'OrderedDict[LazyModel, Pipeline]' = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, model: 'LazyModel') -> Optional[Pipeline]:
+        with self._lock:
+            if model in self._models:
+                self._models.move_to_end(model)
+                return self._models[model]
+
+        pipeline = model.loader()
+        with self._lock:
+            self._models[model] = pipeline
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+        return pipeline
+
+
+_default_model_cache = ModelCache()
+
+
+class LazyModel:
+
+    def __init__(self, loader: Callable[[], Optional[Pipeline]], path: Optional[str] = None):
+        """
+        Placeholder for a fitted pipeline that is only loaded from its source on first access. Loaded pipelines are kept
+        in a cache shared by all lazy models until a RunHistory assigns its own cache
+        :param loader: callable returning the fitted pipeline
+        :param path: optional file the pipeline is loaded from. Used to check the availability without loading it
+        """
+        self.loader = loader
+        self.path = path
+        self.cache = _default_model_cache
+
+    def load(self) -> Optional[Pipeline]:
+        return self.cache.get(self)
+
+    @property
+    def available(self) -> bool:
+        return self.path is None or os.path.exists(self.path)
+
+
 @dataclass()
 class Candidate:
     id: CandidateId
@@ -40,9 +103,33 @@ class Candidate:
     runtime: Dict[str, float]
     config: Configuration
     origin: str
-    model: Optional[Pipeline]
     y_transformer: Callable
 
+    def __init__(self, id: CandidateId, budget: float, status: str, loss: float, runtime: Dict[str, float],
+                 config: Configuration, origin: str, model: Union[Pipeline, LazyModel, None],
+                 y_transformer: Callable):
+        self.id = id
+        self.budget = budget
+        self.status = status
+        self.loss = loss
+        self.runtime = runtime
+        self.config = config
+        self.origin = origin
+        self._model = model
+        self.y_transformer = y_transformer
+
+    @property
+    def model(self) -> Optional[Pipeline]:
+        if isinstance(self._model, LazyModel):
+            return self._model.load()
+        return self._model
+
+    @property
+    def has_model(self) -> bool:
+        if isinstance(self._model, LazyModel):
+            return self._model.available
+        return self._model is not None
+
     def as_dict(self):
         return {
             'id': self.id,
@@ -52,7 +139,44 @@ class Candidate:
             'runtime': self.runtime,
             'config': self.config.get_dictionary(),
             'origin': self.origin,
-            'filled': self.model is not None
+            'filled': self.has_model
+        }
+
+
+class JsonInterner:
+
+    def __init__(self):
+        """
+        Collects serialized values that are shared by multiple structures. Each distinct value is stored only once and
+        referenced by its index
+        """
+        self.configspaces: List[str] = []
+        self.pipelines: List[List[Dict]] = []
+        self._configspace_index: Dict[int, int] = {}
+        self._pipeline_index: Dict[str, int] = {}
+
+    def configspace(self, structure: 'CandidateStructure') -> Optional[int]:
+        if structure.configspace is None:
+            return None
+        if structure.hash not in self._configspace_index:
+            self._configspace_index[structure.hash] = len(self.configspaces)
+            self.configspaces.append(config_json.write(structure.configspace))
+        return self._configspace_index[structure.hash]
+
+    def pipeline(self, structure: 'CandidateStructure') -> int:
+        # Candidate ids are the only structure specific part of the graph. They are restored by the frontend
+        nodes = [{k: v for k, v in node.items() if k != 'cids'}
+                 for node in export_json(pipeline_to_networkx(structure.pipeline, structure.cid))]
+        key = json.dumps(nodes, sort_keys=True)
+        if key not in self._pipeline_index:
+            self._pipeline_index[key] = len(self.pipelines)
+            self.pipelines.append(nodes)
+        return self._pipeline_index[key]
+
+    def as_dict(self):
+        return {
+            'configspaces': self.configspaces,
+            'pipelines': self.pipelines
         }
 
 
@@ -71,12 +195,22 @@ class CandidateStructure:
         self.configs = configs
         self.hash = hash(str(configspace))
 
-    def as_dict(self):
+    def as_dict(self, configs: Optional[List[Candidate]] = None, interner: Optional[JsonInterner] = None):
+        """
+        :param configs: Optional subset of the configs to export. By default, all configs are exported
+        :param interner: If provided, configspace and pipeline are only exported as references into the interner
+        """
+        if interner is not None:
+            configspace, pipeline = interner.configspace(self), interner.pipeline(self)
+        else:
+            configspace = config_json.write(self.configspace) if self.configspace is not None else None
+            pipeline = export_json(pipeline_to_networkx(self.pipeline, self.cid))
+
         return {
             'cid': self.cid,
-            'configspace': config_json.write(self.configspace) if self.configspace is not None else None,
-            'pipeline': export_json(pipeline_to_networkx(self.pipeline, self.cid)),
-            'configs': [c.as_dict() for c in self.configs]
+            'configspace': configspace,
+            'pipeline': pipeline,
+            'configs': [c.as_dict() for c in (self.configs if configs is None else configs)]
         }
 
 
@@ -103,18 +237,32 @@ class Explanations:
 
 
 @dataclass()
+def _ensemble_pipeline(model: LazyModel) -> Pipeline:
+    return Pipeline(steps=[('classifier', model.load())])
+
+
 class Ensemble:
     weights: List[float]
     members: List[CandidateId]
-    model: Pipeline
 
-    def __init__(self, model: Pipeline, members: Dict[CandidateId, float]):
+    def __init__(self, model: Union[Pipeline, LazyModel, None], members: Dict[CandidateId, float]):
         self.members = list(members.keys())
         self.weights = list(members.values())
         self.weight_map = members
-        self.model = model
+        self._model = model
+
+        if isinstance(model, LazyModel):
+            pipeline = LazyModel(partial(_ensemble_pipeline, model), model.path)
+        else:
+            pipeline = Pipeline(steps=[('classifier', model)])
         self.candidate = Candidate('ENSEMBLE', 0, 'SUCCESS', 0, {}, ConfigurationSpace().get_default_configuration(),
-                                   'ensemble', Pipeline(steps=[('classifier', model)]), lambda x: x)
+                                   'ensemble', pipeline, identity)
+
+    @property
+    def model(self) -> Optional[Pipeline]:
+        if isinstance(self._model, LazyModel):
+            return self._model.load()
+        return self._model
 
     def as_dict(self):
         return {
@@ -123,6 +271,36 @@ class Ensemble:
         }
 
 
+class CandidateTable:
+
+    def __init__(self, structures: List[CandidateStructure]):
+        """
+        Column-wise index over the meta-data of all candidates. Each row references the according candidate in
+        candidates. The Candidate objects remain the source of truth, the table is a snapshot taken on construction and
+        has to be rebuilt via RunHistory.reindex after candidates are added or modified
+        """
+        self.candidates: List[Candidate] = [c for s in structures for c in s.configs]
+        self.ids = np.array([c.id for c in self.candidates], dtype=object)
+        self.budget = np.array([c.budget for c in self.candidates], dtype=float)
+        self.status = np.array([c.status for c in self.candidates], dtype=object)
+        self.loss = np.array([c.loss for c in self.candidates], dtype=float)
+        self.timestamp = np.array([c.runtime.get('timestamp', np.nan) for c in self.candidates], dtype=float)
+        self.structure_hash = np.array([s.hash for s in structures for _ in s.configs], dtype=np.int64)
+
+        # Rows of all candidates with an equivalent structure, sorted chronologically
+        self.rows_by_hash: Dict[int, np.ndarray] = {}
+        for hash_ in np.unique(self.structure_hash):
+            rows = np.where(self.structure_hash == hash_)[0]
+            self.rows_by_hash[int(hash_)] = rows[np.argsort(self.timestamp[rows], kind='stable')]
+
+    def equivalent_rows(self, hash_: int, timestamp: float = np.inf) -> np.ndarray:
+        """
+        Rows of all candidates with the given structure hash evaluated before timestamp in chronological order
+        """
+        rows = self.rows_by_hash.get(hash_, np.empty(0, dtype=int))
+        return rows[:np.searchsorted(self.timestamp[rows], timestamp, side='left')]
+
+
 @dataclass()
 class RunHistory:
     meta: MetaInformation
@@ -132,23 +310,86 @@ class RunHistory:
     explanations: Explanations
 
     def __init__(self, meta: MetaInformation, default_configspace: Optional[ConfigurationSpace],
-                 structures: List[CandidateStructure], ensemble: Ensemble, explanations: Explanations):
+                 structures: List[CandidateStructure], ensemble: Ensemble, explanations: Explanations,
+                 max_resident_models: int = 32):
+        """
+        :param max_resident_models: Maximum number of lazily loaded pipelines that are kept in memory at the same time
+        """
         self.meta = meta
         self.default_configspace = default_configspace
         self.structures = structures
         self.ensemble = ensemble
         self.explanations = explanations
 
+        self.model_cache = ModelCache(max_resident_models)
+        self.reindex()
+
+    def reindex(self):
+        """
+        Rebuilds all lookup tables and the candidate table from the current structures and candidates
+        """
         self.cid_to_candidate = {}
-        for s in structures:
+        self.cid_to_structure: Dict[CandidateId, CandidateStructure] = {}
+        self.hash_to_structures: Dict[int, List[CandidateStructure]] = {}
+        for s in self.structures:
+            self.cid_to_structure[s.cid] = s
+            self.hash_to_structures.setdefault(s.hash, []).append(s)
             for c in s.configs:
                 self.cid_to_candidate[c.id] = c
+                if isinstance(c._model, LazyModel):
+                    c._model.cache = self.model_cache
+        for model in (self.ensemble._model, self.ensemble.candidate._model):
+            if isinstance(model, LazyModel):
+                model.cache = self.model_cache
+        self.candidates = CandidateTable(self.structures)
+
+    def as_dict(self, page_size: Optional[int] = None, intern: bool = False):
+        """
+        :param page_size: If provided and the run history contains more candidates, only a summary is exported.
+        Structures and explanations have to be requested via page_as_dict and explanations.as_dict afterwards
+        :param intern: Export each distinct configspace and pipeline only once and reference them by index
+        """
+        n_candidates = len(self.candidates.ids)
+        if page_size is None or n_candidates <= page_size:
+            interner = JsonInterner() if intern else None
+            return {
+                'meta': asdict(self.meta),
+                'default_configspace': config_json.write(self.default_configspace)
+                if self.default_configspace is not None else None,
+                'structures': [s.as_dict(interner=interner) for s in self.structures],
+                'explanations': self.explanations.as_dict(),
+                **(interner.as_dict() if intern else {})
+            }
 
-    def as_dict(self):
         return {
             'meta': asdict(self.meta),
             'default_configspace': config_json.write(self.default_configspace)
             if self.default_configspace is not None else None,
-            'structures': [s.as_dict() for s in self.structures],
-            'explanations': self.explanations.as_dict()
+            'pages': int(np.ceil(n_candidates / page_size))
         }
+
+    def page_as_dict(self, page: int, page_size: int, intern: bool = False):
+        """
+        Exports the candidates in the rows [page * page_size, (page + 1) * page_size) of the candidate table. Each
+        structure is exported completely with the page containing its first candidate, all further pages only contain
+        the remaining candidates of the structure.
+        :param page: index of the page
+        :param page_size: number of candidates per page
+        :param intern: Export each distinct configspace and pipeline only once per page and reference them by index
+        """
+        interner = JsonInterner() if intern else None
+        n_pages = max(int(np.ceil(len(self.candidates.ids) / page_size)), 1)
+        start, end = page * page_size, (page + 1) * page_size
+
+        structures = []
+        row = 0
+        for s in self.structures:
+            first_page = min(row // page_size, n_pages - 1)
+            configs = s.configs[max(start - row, 0):max(end - row, 0)]
+            if first_page == page:
+                structures.append(s.as_dict(configs, interner))
+            elif len(configs) > 0:
+                structures.append({'cid': s.cid, 'configs': [c.as_dict() for c in configs]})
+            row += len(s.configs)
+
+        return {'page': page, 'structures': structures, **(interner.as_dict() if intern else {})}
@@ -1,43 +1,102 @@
 import warnings
-from typing import Union, Optional, Tuple, Dict
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Union, Optional, Tuple, Dict, Callable, Hashable
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
+from sklearn.pipeline import Pipeline
 
 from xautoml.util.constants import SOURCE, SINK
-from xautoml.util.mlinsights import alter_pipeline_for_debugging, enumerate_pipeline_models, get_component
+from xautoml.util.mlinsights import debug_pipeline, get_component, DebugBuffer
 
 COMPLETE = 0
 DESCRIPTION = 1
 RAW = 2
 
 
+@dataclass()
+class StepOutputs:
+    inputs: Dict[str, pd.DataFrame]
+    outputs: Dict[str, pd.DataFrame]
+    y_pred: np.ndarray
+    confidence: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        frames = {id(df): df for df in list(self.inputs.values()) + list(self.outputs.values())}
+        return int(sum(df.memory_usage(index=True, deep=False).sum() for df in frames.values())) + \
+            self.y_pred.nbytes + self.confidence.nbytes
+
+
+class StepOutputStore:
+
+    def __init__(self, max_bytes: int = 512 * 1024 ** 2):
+        """
+        Bounded LRU store of the intermediate outputs of candidates. Entries are evicted once the estimated memory
+        usage of all stored outputs exceeds `max_bytes`. The most recently used entry is always kept.
+        :param max_bytes: maximum memory usage of all stored outputs in bytes
+        """
+        self.max_bytes = max_bytes
+        self._outputs: 'OrderedDict[Hashable, StepOutputs]' = OrderedDict()
+        self._nbytes: Dict[Hashable, int] = {}
+        self._lock = Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], StepOutputs]) -> StepOutputs:
+        with self._lock:
+            if key in self._outputs:
+                self._outputs.move_to_end(key)
+                return self._outputs[key]
+
+        outputs = compute()
+        with self._lock:
+            self._outputs[key] = outputs
+            self._nbytes[key] = outputs.nbytes
+            while len(self._outputs) > 1 and sum(self._nbytes.values()) > self.max_bytes:
+                evicted, _ = self._outputs.popitem(last=False)
+                del self._nbytes[evicted]
+        return outputs
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._outputs
+
+    def clear(self):
+        with self._lock:
+            self._outputs.clear()
+            self._nbytes.clear()
+
+
 class OutputCalculator:
 
+    @staticmethod
+    def _to_frame(d: Dict) -> pd.DataFrame:
+        if len(d) == 0:
+            return pd.DataFrame()
+
+        data = d['predict'] if 'predict' in d else d['transform']
+        columns = d.get('get_feature_names_out', None)
+        if sparse.issparse(data):
+            # Wide one-hot encoded outputs are kept sparse. Only the rendered rows are densified
+            return pd.DataFrame.sparse.from_spmatrix(data, columns=columns)
+        return pd.DataFrame(data, columns=columns)
+
     @staticmethod
     def _load_data(d: Union[Dict, pd.DataFrame],
                    y: pd.Series,
                    y_pred: pd.Series,
                    confidence: np.ndarray,
                    method: int) -> Union[str, pd.DataFrame]:
+        df = OutputCalculator._to_frame(d) if isinstance(d, dict) else d
 
-        if isinstance(d, dict):
-            if len(d) == 0:
-                if method != RAW:
-                    return ''
-                else:
-                    return pd.DataFrame()
-
-            data = d['predict'] if 'predict' in d else d['transform']
-            df = pd.DataFrame(data, columns=d.get('get_feature_names_out', None))
-        else:
-            df = d
+        if df.shape == (0, 0) and method != RAW:
+            return ''
 
         if method == COMPLETE:
-            # Add target column for displaying in raw_dataset.tsx
-            df['TARGET'] = y
-            df['PREDICTION'] = y_pred
-            df['CONFIDENCE'] = confidence
+            # Add target column for displaying in raw_dataset.tsx. Captured outputs may be shared with other steps and
+            # must not be modified
+            df = df.assign(TARGET=y, PREDICTION=y_pred, CONFIDENCE=confidence)
             return df._repr_html_()
         elif method == DESCRIPTION:
             return df.describe()._repr_html_()
@@ -47,13 +106,38 @@ class OutputCalculator:
             raise ValueError('Unknown method {}'.format(method))
 
     @staticmethod
-    def calculate_outputs(pipeline, X: pd.DataFrame, y: Optional[pd.Series], method: int = RAW) -> \
-        Tuple[Dict[str, Union[str, pd.DataFrame]], Dict[str, Union[str, pd.DataFrame]]]:
-        with warnings.catch_warnings():
+    def _predict_single_pass(pipeline, X: pd.DataFrame, buffer: DebugBuffer) -> Tuple[np.ndarray, np.ndarray]:
+        y_proba = pipeline.predict_proba(X)
+
+        # Reuse the input of the final estimator captured during predict_proba instead of running all transformations
+        # a second time
+        final = pipeline.steps[-1][1] if isinstance(pipeline, Pipeline) else None
+        if final is None or final not in buffer or 'predict_proba' not in buffer.get(final).inputs:
+            return pipeline.predict(X), y_proba
+
+        y_pred = final.predict(buffer.get(final).inputs['predict_proba'])
+        buffer.get(pipeline).inputs['predict'] = X
+        buffer.get(pipeline).outputs['predict'] = y_pred
+        return y_pred, y_proba
+
+    @staticmethod
+    def capture_outputs(pipeline, X: pd.DataFrame, single_pass: bool = True) -> StepOutputs:
+        """
+        Captures the raw inputs and outputs of all steps in the pipeline. The pipeline is only instrumented during
+        the calculation and is not modified afterwards
+        :param pipeline: fitted pipeline
+        :param X: input data
+        :param single_pass: run all transformations only once and store references to the intermediate outputs
+        instead of copies. The captured outputs share memory with each other and must be treated as read-only
+        """
+        with warnings.catch_warnings(), debug_pipeline(pipeline, copy=not single_pass) as buffer:
             warnings.simplefilter("ignore", UserWarning)
-            alter_pipeline_for_debugging(pipeline)
-            y_pred = pipeline.predict(X)
-            y_proba = pipeline.predict_proba(X)
+
+            if single_pass:
+                y_pred, y_proba = OutputCalculator._predict_single_pass(pipeline, X, buffer)
+            else:
+                y_pred = pipeline.predict(X)
+                y_proba = pipeline.predict_proba(X)
             confidence = np.max(y_proba, axis=1)
 
             try:
@@ -61,25 +145,110 @@ class OutputCalculator:
             except AttributeError:
                 pass
 
-            inputs = {}
-            outputs = {}
-            for coordinate, model, subset in enumerate_pipeline_models(pipeline):
-                if not hasattr(model, '_debug'):
-                    continue
+        inputs = {}
+        outputs = {}
+        for record in buffer.records.values():
+            input_ = OutputCalculator._to_frame(record.inputs)
+            output = OutputCalculator._to_frame(record.outputs)
 
-                input_ = OutputCalculator._load_data(model._debug.inputs, y, y_pred, confidence, method)
-                output = OutputCalculator._load_data(model._debug.outputs, y, y_pred, confidence, method)
+            if len(record.coordinate) == 1:
+                # Populate SINK and SOURCE instead of single step
+                inputs[SOURCE] = input_
+                outputs[SOURCE] = input_
 
-                if len(coordinate) == 1:
-                    # Populate SINK and SOURCE instead of single step
-                    inputs[SOURCE] = input_
-                    outputs[SOURCE] = input_
+                inputs[SINK] = output
+                outputs[SINK] = output
+            else:
+                step_name, _ = get_component(record.coordinate, pipeline)
+                inputs[step_name] = input_
+                outputs[step_name] = output
 
-                    inputs[SINK] = output
-                    outputs[SINK] = output
-                else:
-                    step_name, _ = get_component(coordinate, pipeline)
-                    inputs[step_name] = input_
-                    outputs[step_name] = output
+        return StepOutputs(inputs, outputs, y_pred, confidence)
 
-            return inputs, outputs
+    @staticmethod
+    def format_outputs(step_outputs: StepOutputs, y: Optional[pd.Series], method: int = RAW) -> \
+        Tuple[Dict[str, Union[str, pd.DataFrame]], Dict[str, Union[str, pd.DataFrame]]]:
+        # Steps sharing the same frame, e.g., SOURCE and SINK, are formatted only once
+        formatted = {}
+
+        def load(df: pd.DataFrame):
+            if id(df) not in formatted:
+                formatted[id(df)] = OutputCalculator._load_data(df, y, step_outputs.y_pred, step_outputs.confidence,
+                                                                method)
+            return formatted[id(df)]
+
+        return {step: load(df) for step, df in step_outputs.inputs.items()}, \
+               {step: load(df) for step, df in step_outputs.outputs.items()}
+
+    @staticmethod
+    def _column_as_json(values: pd.Series) -> Dict:
+        if pd.api.types.is_bool_dtype(values.dtype):
+            dtype = 'boolean'
+        elif pd.api.types.is_numeric_dtype(values.dtype):
+            dtype = 'number'
+        else:
+            dtype = 'string'
+            values = values.where(pd.isna(values), values.astype(str))
+
+        return {'dtype': dtype, 'values': values.astype(object).where(pd.notna(values), None).tolist()}
+
+    @staticmethod
+    def row_window(step_outputs: StepOutputs, y: pd.Series, step: str, offset: int = 0, limit: int = 30,
+                   sort_by: Optional[str] = None, ascending: bool = True) -> Dict:
+        """
+        Exports a window of rows of the output of a single step together with the target, prediction and confidence.
+        Only the rows in the window are densified and serialized.
+        :param step_outputs: captured outputs of the pipeline
+        :param y: ground truth
+        :param step: name of the step
+        :param offset: index of the first row in the window after sorting
+        :param limit: maximum number of rows in the window
+        :param sort_by: optional name of the column used for sorting the rows
+        :param ascending: sort in ascending or descending order
+        """
+        n = step_outputs.y_pred.shape[0]
+        if step not in step_outputs.outputs:
+            return {'step': step, 'missing': True, 'total': 0, 'offset': 0, 'index': [], 'columns': []}
+
+        df = step_outputs.outputs[step]
+        additional = {'TARGET': np.asarray(y), 'PREDICTION': step_outputs.y_pred, 'CONFIDENCE': step_outputs.confidence}
+        names = [str(c) for c in df.columns]
+
+        if sort_by is None:
+            order = np.arange(n)
+        else:
+            if sort_by in additional:
+                values = pd.Series(additional[sort_by])
+            elif sort_by in names:
+                values = pd.Series(np.asarray(df.iloc[:, names.index(sort_by)]))
+            else:
+                raise ValueError('Unknown column {}'.format(sort_by))
+            order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+        rows = order[offset:offset + limit]
+        window = df.iloc[rows] if df.shape[1] > 0 else pd.DataFrame(index=rows)
+
+        columns = []
+        for idx, name in enumerate(names):
+            values = pd.Series(np.asarray(window.iloc[:, idx]))
+            columns.append({'name': name, **OutputCalculator._column_as_json(values)})
+        for name, values in additional.items():
+            columns.append({'name': name, **OutputCalculator._column_as_json(pd.Series(values[rows]))})
+
+        return {'step': step, 'missing': False, 'total': n, 'offset': offset, 'index': rows.tolist(),
+                'columns': columns}
+
+    @staticmethod
+    def calculate_outputs(pipeline, X: pd.DataFrame, y: Optional[pd.Series], method: int = RAW,
+                          single_pass: bool = True) -> \
+        Tuple[Dict[str, Union[str, pd.DataFrame]], Dict[str, Union[str, pd.DataFrame]]]:
+        """
+        Calculates the inputs and outputs of all steps in the pipeline
+        :param pipeline: fitted pipeline. Gets instrumented for debugging
+        :param X: input data
+        :param y: ground truth
+        :param method: output format, either COMPLETE, DESCRIPTION or RAW
+        :param single_pass: run all transformations only once and store references to the intermediate outputs
+        instead of copies. Returned RAW outputs share memory with each other and must be treated as read-only
+        """
+        return OutputCalculator.format_outputs(OutputCalculator.capture_outputs(pipeline, X, single_pass), y, method)
@@ -37,8 +37,20 @@ class RocCurve:
             Global accuracy unless micro or macro scores are requested.
         '''
         # Compute the predictions for the test data
-        y_pred = model.predict_proba(X)
+        self.score_proba(model.predict_proba(X), y, json)
 
+    # noinspection PyAttributeOutsideInit
+    def score_proba(self, y_pred, y, json: bool = False):
+        '''
+        Calculates the ROC curves from already computed class probabilities.
+        Parameters
+        ----------
+        y_pred : ndarray of shape n x c
+            Class probabilities of n instances
+        y : ndarray or Series of length n
+            An array or series of target or class values
+        json :
+        '''
         ttype = type_of_target(y)
         if ttype.startswith(MULTICLASS):
             self.target_type_ = MULTICLASS
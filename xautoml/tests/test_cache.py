@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from xautoml.util.cache import ResultCache, fingerprint
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.get('c') == 3
+
+
+def test_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(max_size=1, directory=tmp)
+        cache.put('a', {'value': [1, 2, 3]})
+        cache.put('b', None)
+
+        restored = ResultCache(max_size=1, directory=tmp)
+        assert 'a' in restored
+        assert restored.get('a') == {'value': [1, 2, 3]}
+
+
+def test_corrupt_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(max_size=1, directory=tmp)
+        cache.put('a', {'value': [1, 2, 3]})
+        with open(os.path.join(tmp, 'a.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+
+        restored = ResultCache(max_size=1, directory=tmp)
+        assert restored.get('a', 'missing') == 'missing'
+        assert 'a' not in restored
+
+        restored.put('a', 42)
+        assert ResultCache(max_size=1, directory=tmp).get('a') == 42
+        assert [f for f in os.listdir(tmp) if f.endswith('.tmp')] == []
+
+
+def test_fingerprint():
+    df = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']})
+    assert fingerprint(df, 'foo') == fingerprint(df.copy(), 'foo')
+    assert fingerprint(df, 'foo') != fingerprint(df.iloc[::-1].reset_index(drop=True), 'foo')
@@ -0,0 +1,41 @@
+import numpy as np
+from ConfigSpace import ConfigurationSpace, CategoricalHyperparameter, UniformFloatHyperparameter, \
+    UniformIntegerHyperparameter, EqualsCondition
+from ConfigSpace.util import impute_inactive_values
+
+from xautoml.util.config import configs_as_dataframe
+
+
+def test_bulk_conversion():
+    cs = ConfigurationSpace(seed=0)
+    a = CategoricalHyperparameter('a', ['x', 'y'])
+    b = UniformFloatHyperparameter('b', 1e-3, 10, log=True)
+    c = UniformIntegerHyperparameter('c', 1, 100)
+    cs.add_hyperparameters([a, b, c])
+    cs.add_condition(EqualsCondition(c, a, 'y'))
+    configs = cs.sample_configuration(20)
+
+    pruned_cs, X = configs_as_dataframe(cs, configs)
+    for config, (_, row) in zip(configs, X.iterrows()):
+        expected = impute_inactive_values(config).get_dictionary()
+        assert row['a'] == a._inverse_transform(expected['a'])
+        assert np.isclose(row['b'], expected['b'])
+        assert row['c'] == expected['c']
+
+
+def test_conversion_other_configspace():
+    cs = ConfigurationSpace(seed=0)
+    a = CategoricalHyperparameter('a', ['x', 'y'])
+    b = UniformFloatHyperparameter('b', 1e-3, 10, log=True)
+    cs.add_hyperparameters([a, b])
+
+    # Same hyperparameters in a different order of the vector representation
+    other = ConfigurationSpace(seed=0)
+    other.add_hyperparameters([UniformFloatHyperparameter('0_b', 1, 2), CategoricalHyperparameter('a', ['y', 'x']),
+                               UniformFloatHyperparameter('b', 1e-3, 10, log=True)])
+    configs = other.sample_configuration(10)
+
+    pruned_cs, X = configs_as_dataframe(cs, configs)
+    for config, (_, row) in zip(configs, X.iterrows()):
+        assert row['a'] == a._inverse_transform(config['a'])
+        assert np.isclose(row['b'], config['b'])
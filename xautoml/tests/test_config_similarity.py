@@ -1,3 +1,7 @@
+import numpy as np
+from ConfigSpace import ConfigurationSpace, CategoricalHyperparameter, UniformFloatHyperparameter, EqualsCondition
+
+from xautoml.config_similarity import ConfigSimilarity, ConfigEmbedding
 from xautoml.tests import get_168746, get_autosklearn, get_31
 
 
@@ -17,3 +21,41 @@ def test_mcts():
     main = get_31()
     print(main._config_similarity())
     print(main._config_similarity())
+
+
+def test_landmarks():
+    cs = ConfigurationSpace(seed=0)
+    cs.add_hyperparameters([UniformFloatHyperparameter('a', 0, 1), UniformFloatHyperparameter('b', 0, 1)])
+    configs = cs.sample_configuration(50)
+    loss = np.random.RandomState(0).random(50)
+
+    res = ConfigSimilarity.compute([cs], [configs], loss, False, max_exact=10, n_landmarks=20)
+    assert len(res['config']) + len(res['incumbents']) == 50
+
+
+def test_depths():
+    cs = ConfigurationSpace()
+    a = CategoricalHyperparameter('a', ['x', 'y'])
+    b = CategoricalHyperparameter('b', ['x', 'y'])
+    c = UniformFloatHyperparameter('c', 0, 1)
+    cs.add_hyperparameters([a, b, c])
+    cs.add_conditions([EqualsCondition(b, a, 'x'), EqualsCondition(c, b, 'y')])
+
+    assert ConfigSimilarity.get_depths(cs) == {'a': 1, 'b': 2, 'c': 3}
+
+
+def test_incremental_embedding():
+    cs = ConfigurationSpace(seed=0)
+    cs.add_hyperparameters([UniformFloatHyperparameter('a', 0, 1), UniformFloatHyperparameter('b', 0, 1)])
+    configs = cs.sample_configuration(40)
+    loss = np.random.RandomState(0).random(40)
+    cids = [str(i) for i in range(40)]
+
+    embedding = ConfigEmbedding()
+    res1 = ConfigSimilarity.compute([cs], [configs[:30]], loss[:30], False, cids=cids[:30], embedding=embedding)
+    res2 = ConfigSimilarity.compute([cs], [configs], loss, False, cids=cids, embedding=embedding)
+
+    location1 = {p['idx']: (p['x'], p['y']) for p in res1['config'] + res1['incumbents']}
+    location2 = {p['idx']: (p['x'], p['y']) for p in res2['config'] + res2['incumbents']}
+    assert all(location1[idx] == location2[idx] for idx in location1)
+    assert embedding.n_contour == 40
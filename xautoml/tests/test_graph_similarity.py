@@ -0,0 +1,35 @@
+import networkx as nx
+
+from xautoml.graph_similarity import GraphMatching
+
+
+def _chain(cid, *nodes):
+    g = nx.DiGraph()
+    g.add_node('SOURCE', cids=[cid], other_paths={})
+    prev = 'SOURCE'
+    for node in nodes:
+        g.add_node(node, label=node, cids=[cid], other_paths={})
+        g.add_edge(prev, node)
+        prev = node
+    return g
+
+
+def test_similarity_matrix():
+    similarity = GraphMatching._compute_node_similarity_matrix(_chain('a', 'x', 'y'), _chain('b', 'y', 'z'))
+    assert similarity.tolist() == [[1, 0, 0], [0, 0, 0], [0, 1, 0]]
+
+
+def test_equivalence_without_cycles():
+    # Merging both x and y would introduce a cycle
+    equivalence_g1, _ = GraphMatching._compute_node_equivalence(_chain('a', 'x', 'y'), _chain('b', 'y', 'x'))
+    assert 'SOURCE' in equivalence_g1
+    assert len(equivalence_g1) == 2
+
+
+def test_structure_history():
+    graphs = [_chain('a', 'x', 'y'), _chain('b', 'x', 'z'), _chain('c', 'x', 'y')]
+    merged, history = GraphMatching.create_structure_history(graphs, [1, 2, 1])
+
+    assert merged.nodes['y']['cids'] == ['a', 'c']
+    assert merged.nodes['SOURCE']['cids'] == ['a', 'b', 'c']
+    assert [n['id'] for n in history[1]] == ['SOURCE', 'x', 'z']
@@ -1,13 +1,23 @@
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 from fanova import visualizer
 
-from xautoml.hp_importance import HPImportance
+from xautoml.hp_importance import HPImportance, MarginalEngine, FanovaCache, _forest_file
 from xautoml.output import RAW, OutputCalculator
 from xautoml.tests import get_168746, get_autosklearn
 
 
+def _structure_fanova():
+    main = get_168746()
+
+    structure = main.run_history.structures[0]
+    loss = np.array([c.loss for c in structure.configs])
+    configs = [c.config for c in structure.configs]
+    return HPImportance.construct_fanova(structure.configspace, configs, loss)
+
+
 def test_overview():
     main = get_168746()
 
@@ -50,14 +60,14 @@ def test_details():
     details = HPImportance.calculate_fanova_details(f, X)
     print(json.dumps(details))
 
-    vis = visualizer.Visualizer(f, f.cs, '/tmp')
+    engine = MarginalEngine.of(f)
 
-    discrete = HPImportance._get_plot_data(vis, 0)
-    continuous = HPImportance._get_plot_data(vis, 6)
+    discrete = HPImportance._get_plot_data(engine, 0)
+    continuous = HPImportance._get_plot_data(engine, 6)
 
-    disc_disc = HPImportance._get_pairwise_plot_data(vis, [0, 1])
-    cont_cont = HPImportance._get_pairwise_plot_data(vis, [5, 6])
-    disc_cont = HPImportance._get_pairwise_plot_data(vis, [0, 6])
+    disc_disc = HPImportance._get_pairwise_plot_data(engine, (0, 1))
+    cont_cont = HPImportance._get_pairwise_plot_data(engine, (5, 6))
+    disc_cont = HPImportance._get_pairwise_plot_data(engine, (0, 6))
 
 
 def test_expected_performance_simulation():
@@ -117,3 +127,86 @@ def test_all_auto_sklearn_steps():
 
     for step_name in inputs.keys():
         res = main._decision_tree_surrogate('00:03:05', step_name, 3)
+
+
+def test_fanova_cache():
+    main = get_autosklearn()
+    f1, _, _ = main._construct_fanova(None)
+    f2, _, _ = main._construct_fanova(None)
+    assert f1 is f2
+
+
+def test_overview_parallel():
+    f, X = _structure_fanova()
+    serial = HPImportance.calculate_fanova_overview(f, X)
+    parallel = HPImportance.calculate_fanova_overview(f, X, n_jobs=2)
+    assert serial.equals(parallel)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for _ in range(2):
+            shared = HPImportance.calculate_fanova_overview(f, X, n_jobs=2, executor=executor)
+            assert serial.equals(shared)
+    # The forest is only written once for all requests
+    assert _forest_file(f) == _forest_file(f)
+
+
+def test_overview_pruned():
+    f, X = _structure_fanova()
+    complete = HPImportance.calculate_fanova_overview(f, X)
+    pruned = HPImportance.calculate_fanova_overview(f, X, prune=True)
+    assert complete['mean'].tolist() == pruned['mean'].tolist()
+
+
+def test_overview_min_importance():
+    f, X = _structure_fanova()
+    complete = HPImportance.calculate_fanova_overview(f, X, n_head=10000, min_importance=0)
+    filtered = HPImportance.calculate_fanova_overview(f, X, n_head=10000, min_importance=0.5)
+    assert filtered.shape[0] < complete.shape[0]
+    assert set(filtered.index).issubset(complete.index)
+
+
+def test_marginal_engine():
+    f, X = _structure_fanova()
+    vis = visualizer.Visualizer(f, f.cs, '/tmp')
+
+    mean, std, grid = vis.generate_marginal(6, 10)
+    actual_grid, actual_mean, actual_std = MarginalEngine.of(f).marginal(6, 10)
+    assert np.allclose(grid, actual_grid)
+    assert np.allclose(mean, actual_mean)
+    assert np.allclose(std, actual_std)
+
+
+def test_fanova_cache_bounded():
+    cache = FanovaCache(max_structures=2, max_forests=2)
+    for hash_ in range(3):
+        for count in range(2, 5):
+            cache.put(hash_, count, (None, None))
+
+    assert len(cache) == 4
+    assert cache.counts(0) == []
+    assert cache.counts(2) == [3, 4]
+
+
+def test_hp_interactions_layout():
+    main = get_168746()
+    structure = main.run_history.structures[0]
+    f, X, _ = main._construct_fanova(structure.cid)
+    engine = MarginalEngine.of(f)
+    names = [f.cs.get_hyperparameter_by_idx(i) for i in range(7)]
+
+    discrete = main.hp_interactions(structure.cid, None, names[0])
+    assert discrete.shape[0] == 2
+    assert (discrete.iloc[0] <= discrete.iloc[1]).all()
+
+    continuous = main.hp_interactions(structure.cid, None, names[6])
+    assert continuous.columns.tolist() == ['x', 'y', 'area']
+    assert all(upper >= lower for upper, lower in continuous['area'])
+
+    heatmap = main.hp_interactions(structure.cid, None, names[5], names[6])
+    details = HPImportance._get_pairwise_plot_data(engine, (5, 6), resolution=20)
+    assert heatmap.index.tolist() == details['x']
+    assert heatmap.columns.tolist() == details['y']
+
+    mixed = main.hp_interactions(structure.cid, None, names[0], names[6])
+    assert mixed.columns[0] == 'x'
+    assert mixed.columns.tolist()[1:] == engine.labels(0)
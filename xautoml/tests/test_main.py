@@ -1,8 +1,30 @@
 import json
 
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
+
+from xautoml.adapter import import_sklearn
+from xautoml.hp_importance import ForestNotReady, HPImportance
+from xautoml.main import XAutoML
 from xautoml.tests import get_31, get_autosklearn, get_168746, get_1823, get_7306
 
 
+class _InPlaceScaler(BaseEstimator, TransformerMixin):
+    """Transformer that overwrites its input, like some third-party pipeline steps do"""
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        X['a'] = X['a'] * 2
+        return X
+
+
 def test_serialization_fixed_structure():
     main = get_168746()
     print(json.dumps(main._repr_mimebundle_(None, None)))
@@ -111,3 +133,70 @@ def test_ensemble_predictions():
 def test_explain():
     main = get_autosklearn()
     print(main.explain(include={'overview', 'leaderboard'}).data)
+
+
+def test_load_models():
+    main = get_168746()
+    model = main.run_history.cid_to_candidate['00:00:00'].model
+
+    _, _, shared = main._load_model('00:00:00')
+    assert shared is model
+
+
+def test_pipeline_history():
+    main = get_autosklearn()
+    history = main._get_pipeline_history().data
+    assert len(history['merged']) == len(history['individual'])
+
+
+def test_surrogate_checkpoints():
+    main = get_autosklearn()
+    main.surrogate_checkpoints = 4
+    try:
+        main._simulate_surrogate('00:01', 200)
+    except ForestNotReady:
+        pass
+    # Checkpoints are trained sequentially by a single thread
+    main._checkpoint_executor.submit(lambda: None).result()
+
+    assert len(main._fanova_cache) > 0
+    assert main._simulate_surrogate('00:01', 200).data is not None
+    main.close()
+
+
+def test_surrogate_checkpoint_failure(monkeypatch):
+    def fail(cs, configs, loss):
+        raise ValueError('Broken configuration space')
+
+    monkeypatch.setattr(HPImportance, 'construct_fanova', fail)
+    main = get_autosklearn()
+    try:
+        main._simulate_surrogate('00:01', 200)
+    except (ForestNotReady, ValueError):
+        pass
+    main._checkpoint_executor.submit(lambda: None).result()
+
+    # Failed forests are reported instead of being scheduled again
+    with pytest.raises(ValueError, match='Broken configuration space'):
+        main._simulate_surrogate('00:01', 200)
+    assert len(main._pending_checkpoints) == 0
+    main.close()
+
+
+def test_input_not_modified():
+    X = pd.DataFrame({'a': np.arange(100, dtype=float), 'b': np.arange(100, dtype=float) % 7})
+    y = pd.Series(np.arange(100) % 2)
+    pipeline = Pipeline([('scaler', _InPlaceScaler()), ('clf', LogisticRegression())])
+    search = GridSearchCV(pipeline, {'clf__C': [0.1, 1.0]}, cv=2).fit(X.copy(), y)
+    main = XAutoML(import_sklearn(search), X, y)
+    cid = str(search.best_index_)
+    expected = main.X.copy()
+
+    main._performance_data(cid)
+    main._decision_tree_surrogate(cid, 'SOURCE', None)
+    main._pdp(cid, 'SOURCE', ['a'])
+    main._predictions.predict(cid)
+    main.pipeline(cid)
+    main._load_model(cid)
+
+    pd.testing.assert_frame_equal(main.X, expected)
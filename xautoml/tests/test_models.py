@@ -0,0 +1,122 @@
+import numpy as np
+
+from xautoml.models import LazyModel, ModelCache
+
+
+def test_lazy_model():
+    loads = []
+
+    def loader(name):
+        return lambda: loads.append(name) or name
+
+    cache = ModelCache(max_size=1)
+    a, b = LazyModel(loader('a')), LazyModel(loader('b'))
+    a.cache = b.cache = cache
+
+    assert loads == []
+    assert a.load() == 'a'
+    assert a.load() == 'a'
+    assert b.load() == 'b'
+    assert a.load() == 'a'
+    assert loads == ['a', 'b', 'a']
+
+
+def test_has_model(tmp_path):
+    from xautoml.models import Candidate
+
+    path = tmp_path / 'model.joblib'
+    path.write_bytes(b'')
+    candidate = Candidate('00:00:00', 1, 'SUCCESS', 0, {}, None, 'default', LazyModel(lambda: None, str(path)),
+                          lambda y: y)
+    assert candidate.has_model
+
+    path.unlink()
+    assert not candidate.has_model
+
+
+def test_reindex():
+    from xautoml.tests import get_31
+
+    rh = get_31().run_history
+    removed = rh.structures[0].configs.pop()
+    assert removed.id in rh.candidates.ids
+
+    rh.reindex()
+    assert removed.id not in rh.candidates.ids
+    assert removed.id not in rh.cid_to_candidate
+
+
+def test_save_load(tmp_path):
+    from xautoml.tests import get_168746
+    from xautoml.util.persistence import save_run_history, load_run_history
+
+    rh = get_168746().run_history
+    save_run_history(rh, str(tmp_path))
+    loaded = load_run_history(str(tmp_path))
+
+    assert loaded.as_dict() == rh.as_dict()
+    assert loaded.candidates.ids.tolist() == rh.candidates.ids.tolist()
+    assert all(c._model is None or isinstance(c._model, LazyModel) for c in loaded.cid_to_candidate.values())
+    assert isinstance(loaded.ensemble._model, LazyModel)
+
+    # Lazily loaded pipelines are linked instead of being loaded again
+    save_run_history(loaded, str(tmp_path / 'copy'))
+    assert len(loaded.model_cache._models) == 0
+    assert load_run_history(str(tmp_path / 'copy')).as_dict() == rh.as_dict()
+
+    assert type(loaded.ensemble.model) == type(rh.ensemble.model)
+    assert loaded.ensemble.candidate.model.steps[0][1] is loaded.ensemble.model
+
+
+def test_save_unpicklable_transformer(tmp_path):
+    import pytest
+    from xautoml.tests import get_168746
+    from xautoml.util.persistence import save_run_history
+
+    rh = get_168746().run_history
+    rh.structures[0].configs[0].y_transformer = lambda y: y
+    with pytest.warns(UserWarning, match='can not be pickled'):
+        save_run_history(rh, str(tmp_path))
+
+
+def test_pages():
+    from xautoml.tests import get_autosklearn
+
+    rh = get_autosklearn().run_history
+    summary = rh.as_dict(page_size=10)
+    assert 'structures' not in summary
+
+    configs = {}
+    for page in range(summary['pages']):
+        for s in rh.page_as_dict(page, 10)['structures']:
+            configs.setdefault(s['cid'], []).extend(s['configs'])
+    assert configs == {s['cid']: s['configs'] for s in rh.as_dict()['structures']}
+
+
+def test_interned():
+    from xautoml.tests import get_31
+
+    rh = get_31().run_history
+    plain = rh.as_dict()
+    interned = rh.as_dict(intern=True)
+
+    assert len(interned['configspaces']) <= len(rh.structures)
+    for s, ref in zip(plain['structures'], interned['structures']):
+        if s['configspace'] is not None:
+            assert interned['configspaces'][ref['configspace']] == s['configspace']
+        pipeline = [{**node, 'cids': [s['cid']]} for node in interned['pipelines'][ref['pipeline']]]
+        assert pipeline == s['pipeline']
+
+
+def test_equivalent_rows():
+    from xautoml.tests import get_31
+
+    rh = get_31().run_history
+    table = rh.candidates
+    for hash_, structures in rh.hash_to_structures.items():
+        rows = table.equivalent_rows(hash_)
+        assert sorted(table.ids[rows]) == sorted(c.id for s in structures for c in s.configs)
+        assert (np.diff(table.timestamp[rows]) >= 0).all()
+
+        cutoff = np.median(table.timestamp[rows])
+        assert (table.timestamp[table.equivalent_rows(hash_, cutoff)] < cutoff).all()
@@ -30,3 +30,114 @@ def test_outputs_auto_sklearn():
     inputs, outputs = df_handler.calculate_outputs(pipeline, X, y, method=RAW)
 
     print(outputs)
+
+
+def test_single_pass():
+    main = get_168746()
+    X, y, pipeline = main.pipeline('00:00:00')
+    _, _, reference = main.pipeline('00:00:00')
+
+    inputs, outputs = OutputCalculator.calculate_outputs(pipeline, X, y, method=RAW)
+    expected_inputs, expected_outputs = OutputCalculator.calculate_outputs(reference, X, y, method=RAW,
+                                                                           single_pass=False)
+
+    assert outputs.keys() == expected_outputs.keys()
+    for step in outputs.keys():
+        assert inputs[step].equals(expected_inputs[step])
+        assert outputs[step].equals(expected_outputs[step])
+
+
+def test_step_output_store():
+    from xautoml.output import StepOutputStore
+
+    main = get_168746()
+    X, y, pipeline = main.pipeline('00:00:00')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return OutputCalculator.capture_outputs(pipeline, X)
+
+    store = StepOutputStore()
+    assert store.get('a', compute) is store.get('a', compute)
+    assert len(calls) == 1
+
+    store = StepOutputStore(max_bytes=0)
+    store.get('a', compute)
+    store.get('b', compute)
+    assert 'a' not in store and 'b' in store
+
+
+def test_sparse_outputs():
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    X = pd.DataFrame({'a': np.arange(100) % 20, 'b': np.arange(100) % 7})
+    y = pd.Series(np.arange(100) % 2)
+    pipeline = Pipeline([('one_hot', OneHotEncoder(sparse=True)), ('clf', LogisticRegression())]).fit(X, y)
+
+    inputs, outputs = OutputCalculator.calculate_outputs(pipeline, X, y, method=RAW)
+    assert all(isinstance(dtype, pd.SparseDtype) for dtype in outputs['one_hot'].dtypes)
+    assert outputs['one_hot'].shape == (100, 27)
+
+
+def test_sparse_step_explanations():
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import GridSearchCV
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    from xautoml.adapter import import_sklearn
+    from xautoml.main import XAutoML
+
+    X = pd.DataFrame({'a': np.arange(100) % 20, 'b': np.arange(100) % 7})
+    y = pd.Series(np.arange(100) % 2)
+    pipeline = Pipeline([('one_hot', OneHotEncoder(sparse=True)), ('scaler', StandardScaler(with_mean=False)),
+                         ('clf', LogisticRegression())])
+    search = GridSearchCV(pipeline, {'clf__C': [0.1, 1.0]}, cv=2).fit(X, y)
+    main = XAutoML(import_sklearn(search), X, y)
+    cid = str(search.best_index_)
+
+    surrogate = main._decision_tree_surrogate(cid, 'one_hot', 5).data
+    assert surrogate['candidates'][0]['fidelity'] > 0
+
+    lime = main._lime(cid, 0, 'one_hot').data
+    assert not lime['categorical_input']
+    assert len(lime['expl']) > 0
+
+
+def test_row_window():
+    main = get_168746()
+    X, y, pipeline = main.pipeline('00:00:00')
+    step_outputs = OutputCalculator.capture_outputs(pipeline, X)
+
+    window = OutputCalculator.row_window(step_outputs, y, 'SOURCE', offset=10, limit=5)
+    assert window['total'] == X.shape[0]
+    assert window['index'] == list(range(10, 15))
+    assert [c['name'] for c in window['columns']][-3:] == ['TARGET', 'PREDICTION', 'CONFIDENCE']
+
+    window = OutputCalculator.row_window(step_outputs, y, 'SOURCE', limit=20, sort_by='CONFIDENCE', ascending=False)
+    confidence = window['columns'][-1]['values']
+    assert confidence == sorted(confidence, reverse=True)
+
+
+def test_debug_pipeline_detaches():
+    from xautoml.util.mlinsights import debug_pipeline, enumerate_pipeline_models
+
+    main = get_168746()
+    X, y, pipeline = main.pipeline('00:00:00')
+
+    with debug_pipeline(pipeline) as buffer:
+        pipeline.predict(X)
+    assert len(buffer.get(pipeline).inputs) > 0
+    assert all('predict' not in vars(model) and 'transform' not in vars(model)
+               for _, model, _ in enumerate_pipeline_models(pipeline) if hasattr(model, '__dict__'))
+
+    first = OutputCalculator.capture_outputs(pipeline, X)
+    second = OutputCalculator.capture_outputs(pipeline, X)
+    assert first.outputs.keys() == second.outputs.keys()
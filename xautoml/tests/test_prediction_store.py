@@ -0,0 +1,73 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from xautoml.util.prediction_store import PredictionStore
+
+
+def _model_and_data():
+    X = pd.DataFrame({'a': np.arange(20, dtype=float), 'b': np.arange(20, dtype=float) % 3})
+    y = pd.Series(['x'] * 10 + ['y'] * 10)
+    return Pipeline(steps=[('clf', LogisticRegression())]).fit(X, y), X
+
+
+def test_single_evaluation():
+    model, X = _model_and_data()
+    calls = []
+
+    def load(cid):
+        calls.append(cid)
+        return model
+
+    store = PredictionStore(X, load)
+    assert store.predict_proba('a').dtype == np.float32
+    assert (store.predict('a') == model.predict(X)).all()
+    store.duration('a')
+    assert calls == ['a']
+
+
+def test_memory_mapped():
+    model, X = _model_and_data()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PredictionStore(X, lambda cid: model, tmp)
+        proba = store.predict_proba('00:01:02')
+        assert isinstance(proba, np.memmap)
+        assert np.allclose(proba, model.predict_proba(X), atol=1e-6)
+
+
+def test_reuse_stored_predictions():
+    model, X = _model_and_data()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PredictionStore(X, lambda cid: model, tmp)
+        store.predict('00:01:02')
+        store.predict_proba('00:01:02')
+
+        def fail(cid):
+            raise AssertionError('Model must not be loaded again')
+
+        store = PredictionStore(X, fail, tmp)
+        assert (store.predict('00:01:02') == model.predict(X)).all()
+        assert isinstance(store.predict_proba('00:01:02'), np.memmap)
+
+
+def test_lazy_probabilities():
+    model, X = _model_and_data()
+    calls = []
+
+    def load(cid):
+        calls.append(cid)
+        return model
+
+    store = PredictionStore(X, load, max_probabilities=1)
+    store.duration('a')
+    store.duration('b')
+    assert store._proba == {}
+
+    store.predict_proba('a')
+    store.predict_proba('b')
+    assert list(store._proba.keys()) == ['b']
+    assert np.allclose(store.predict_proba('a'), model.predict_proba(X), atol=1e-6)
+    assert calls == ['a', 'b', 'a', 'b', 'a']
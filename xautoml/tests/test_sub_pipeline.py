@@ -19,6 +19,19 @@ def test_subpipeline():
         sub_pipeline.predict(sub_X)
 
 
+def test_subpipeline_keeps_model():
+    main = get_168746()
+    X, y, pipeline = main._load_model('00:00:00')
+    fitted_names = [hasattr(model, 'feature_names_in_') for _, model, _ in enumerate_pipeline_models(pipeline)]
+
+    for step in ['data_preprocessing:categorical', 'parallel:pca', 'SINK']:
+        main._decision_tree_surrogate('00:00:00', step, 10)
+
+    assert main._load_model('00:00:00')[2] is pipeline
+    assert fitted_names == [hasattr(model, 'feature_names_in_') for _, model, _ in enumerate_pipeline_models(pipeline)]
+    pipeline.predict(X)
+
+
 def test_subpipeline_autosklearn():
     main = get_autosklearn()
     for step in ['SOURCE', 'data_preprocessor', 'data_preprocessor:feature_type',
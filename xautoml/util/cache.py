@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Optional
+
+import joblib
+import pandas as pd
+
+
+def fingerprint(*values) -> str:
+    """
+    Computes a stable fingerprint of the given values. DataFrames and Series are hashed by content, all other values
+    by their string representation.
+    """
+    sha = hashlib.sha1()
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            sha.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+            names = value.columns.tolist() if isinstance(value, pd.DataFrame) else [value.name]
+            sha.update(repr(names).encode('utf-8'))
+        else:
+            sha.update(repr(value).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, max_size: int = 128, directory: Optional[str] = None):
+        """
+        Two-level cache for computation results. The most recently used results are kept in memory, bounded by
+        `max_size` entries. If a directory is provided, every result is additionally persisted on disk so that it
+        survives kernel restarts.
+
+        :param max_size: maximum number of results kept in memory
+        :param directory: optional directory used for persisting results
+        """
+        self.max_size = max_size
+        self.directory = directory
+        self._memory: OrderedDict = OrderedDict()
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        if self.directory is not None:
+            file = self._file(key)
+            try:
+                value = joblib.load(file)
+            except FileNotFoundError:
+                return default
+            except Exception:
+                # Corrupt or incompatible file, e.g. written by an interrupted process or another library version.
+                # Treated as a miss, the result is computed and stored again
+                self._remove(file)
+                return default
+            self._put_memory(key, value)
+            return value
+
+        return default
+
+    def put(self, key: str, value: Any):
+        self._put_memory(key, value)
+        if self.directory is not None:
+            # Write to a temporary file first and move it into place, so readers never see a partially written file
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    joblib.dump(value, f)
+                os.replace(tmp, self._file(key))
+            except BaseException:
+                self._remove(tmp)
+                raise
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory or (self.directory is not None and os.path.exists(self._file(key)))
+
+    def clear(self):
+        self._memory.clear()
+        if self.directory is not None:
+            for file in os.listdir(self.directory):
+                if file.endswith('.pkl') or file.endswith('.tmp'):
+                    os.remove(os.path.join(self.directory, file))
+
+    def _put_memory(self, key: str, value: Any):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.directory, '{}.pkl'.format(key))
+
+    @staticmethod
+    def _remove(file: str):
+        try:
+            os.remove(file)
+        except OSError:
+            pass
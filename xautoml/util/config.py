@@ -2,25 +2,33 @@ from typing import Union, List, Tuple
 
 import numpy as np
 import pandas as pd
-from ConfigSpace import ConfigurationSpace, Configuration, CategoricalHyperparameter
-from ConfigSpace.util import impute_inactive_values
+from ConfigSpace import ConfigurationSpace, Configuration, CategoricalHyperparameter, OrdinalHyperparameter, Constant
+from ConfigSpace.hyperparameters import Hyperparameter
 
 
 def configs_as_dataframe(cs: ConfigurationSpace,
                          configs: List[Configuration]) -> Union[pd.DataFrame, Tuple[ConfigurationSpace, pd.DataFrame]]:
-    def prep_config(c: Configuration):
-        conf = impute_inactive_values(c)
-        return conf.get_dictionary()
+    hps = cs.get_hyperparameters()
 
-    configs_ = [prep_config(c) for c in configs]
+    # All configurations are converted in bulk using their vector representation. Inactive hyperparameters are encoded
+    # as NaN and imputed with the vector representation of their default value. The vector representation is only
+    # meaningful for configurations of cs, all other configurations are converted by hyperparameter name
+    matches_cs = {}
+    for c in configs:
+        space = c.configuration_space
+        if id(space) not in matches_cs:
+            matches_cs[id(space)] = space is cs or space == cs
+    vectors = np.array([c.get_array() if matches_cs[id(c.configuration_space)] else _dictionary_to_vector(hps, c)
+                        for c in configs], dtype=float).reshape(len(configs), len(hps))
+    defaults = np.array([hp._inverse_transform(hp.default_value) for hp in hps], dtype=float)
+    vectors = np.where(np.isnan(vectors), defaults, vectors)
 
-    X = pd.DataFrame(configs_, columns=cs.get_hyperparameter_names())
-    pruned_cs = ConfigurationSpace()
-    for hp in cs.get_hyperparameters():
-        if isinstance(hp, CategoricalHyperparameter):
-            X[hp.name] = X[hp.name].map(hp._inverse_transform)
+    columns = {hp.name: _vector_to_values(hp, vectors[:, idx]) for idx, hp in enumerate(hps)}
+    X = pd.DataFrame(columns, columns=cs.get_hyperparameter_names())
 
-        if X[hp.name].nunique() == 1 and X.shape[0] > 1:
+    pruned_cs = ConfigurationSpace()
+    for hp in hps:
+        if X.shape[0] > 1 and (X[hp.name] == X[hp.name].iloc[0]).all():
             X.drop(hp.name, axis=1, inplace=True)
         else:
             pruned_cs.add_hyperparameter(hp)
@@ -35,6 +43,27 @@ def configs_as_dataframe(cs: ConfigurationSpace,
     return pruned_cs, X
 
 
+def _dictionary_to_vector(hps: List[Hyperparameter], config: Configuration) -> np.ndarray:
+    values = config.get_dictionary()
+    return np.array([hp._inverse_transform(values[hp.name]) if values.get(hp.name) is not None else np.nan
+                     for hp in hps], dtype=float)
+
+
+def _vector_to_values(hp: Hyperparameter, vector: np.ndarray) -> np.ndarray:
+    if isinstance(hp, CategoricalHyperparameter):
+        # Categorical hyperparameters are represented by the index of the selected choice
+        return vector.astype(int)
+    elif isinstance(hp, OrdinalHyperparameter):
+        return np.array(hp.sequence, dtype=object)[vector.astype(int)]
+    elif isinstance(hp, Constant):
+        return np.full(vector.shape, hp.value, dtype=object)
+
+    try:
+        return np.asarray(hp._transform(vector))
+    except (TypeError, ValueError):
+        return np.array([hp._transform(v) for v in vector])
+
+
 def plot_runhistory(plot_data: np.ndarray):
     import matplotlib.pyplot as plt
 
@@ -2,10 +2,9 @@
 @file
 @brief Dig into pipelines.
 """
-import textwrap
 import warnings
-from types import MethodType
-from typing import Tuple
+from contextlib import contextmanager
+from typing import Tuple, Dict, Optional, Iterator
 
 from sklearn.base import TransformerMixin, ClassifierMixin, RegressorMixin, BaseEstimator
 from sklearn.compose import ColumnTransformer, TransformedTargetRegressor
@@ -89,148 +88,132 @@ def enumerate_pipeline_models(pipe, coor=None, vs=None):
                 "pipe is not a scikit-learn object: {}\n{}".format(type(pipe), pipe))
 
 
-class BaseEstimatorDebugInformation:
+def modifies_input(model) -> bool:
     """
-    Stores information when the outputs of a pipeline
-    is computed. It as added by function
-    @see fct alter_pipeline_for_debugging.
+    Checks whether a model may modify its input in place. By scikit-learn convention,
+    this is the case for models with *copy=False*. auto-sklearn wraps the actual
+    transformer in a *preprocessor* attribute.
     """
+    candidates = [model, getattr(model, 'preprocessor', None)]
+    return any(getattr(m, 'copy', True) is False for m in candidates if m is not None)
 
-    def __init__(self, model):
+
+def _record_call(record, method, func, model, copy, X, *args, **kwargs):
+    if copy:
+        record.inputs[method] = X.copy()
+        y = func(X, *args, **kwargs)
+        record.outputs[method] = y.copy()
+    else:
+        # Only references are stored. Models modifying their input in place work on a
+        # private copy to keep the snapshots of the previous steps intact
+        record.inputs[method] = X
+        y = func(X.copy() if modifies_input(model) else X, *args, **kwargs)
+        record.outputs[method] = y
+    return y
+
+
+DEBUG_METHODS = ('transform', 'predict', 'predict_proba', 'decision_function', 'get_feature_names_out')
+_MISSING = object()
+
+
+class DebugRecord:
+    """
+    Inputs and outputs of a single model recorded by
+    @see fct debug_pipeline.
+    """
+
+    def __init__(self, model, coordinate: Tuple[int]):
         self.model = model
+        self.coordinate = coordinate
         self.inputs = {}
         self.outputs = {}
-        self.methods = {}
-        if hasattr(model, "transform") and callable(model.transform):
-            model._debug_transform = model.transform
-            self.methods["transform"] = lambda model, X: model._debug_transform(
-                X)
-        if hasattr(model, "predict") and callable(model.predict):
-            model._debug_predict = model.predict
-            self.methods["predict"] = lambda model, X: model._debug_predict(X)
-        if hasattr(model, "predict_proba") and callable(model.predict_proba):
-            model._debug_predict_proba = model.predict_proba
-            self.methods["predict_proba"] = lambda model, X: model._debug_predict_proba(
-                X)
-        if hasattr(model, "decision_function") and callable(model.decision_function):
-            model._debug_decision_function = model.decision_function
-            self.methods["decision_function"] = lambda model, X: model._debug_decision_function(
-                X)
-        if hasattr(model, "get_feature_names_out") and callable(model.get_feature_names_out):
-            model._get_feature_names_out = model.get_feature_names_out
-            self.methods["get_feature_names_out"] = lambda model, feature_names: model._get_feature_names_out(
-                feature_names)
-
-    def __repr__(self):
-        """
-        usual
-        """
-        return self.to_str()
-
-    def to_str(self, nrows=5):
-        """
-        Tries to produce a readable message.
-        """
-        rows = ['BaseEstimatorDebugInformation({})'.format(
-            self.model.__class__.__name__)]
-        for k in sorted(self.inputs):
-            if k in self.outputs:
-                rows.append('  ' + k + '(')
-                self.display(self.inputs[k], nrows)
-                rows.append(textwrap.indent(
-                    self.display(self.inputs[k], nrows), '   '))
-                rows.append('  ) -> (')
-                rows.append(textwrap.indent(
-                    self.display(self.outputs[k], nrows), '   '))
-                rows.append('  )')
-            else:
-                raise KeyError(  # pragma: no cover
-                    "Unable to find output for method '{}'.".format(k))
-        return "\n".join(rows)
-
-    def display(self, data, nrows):
-        """
-        Displays the first
-        """
-        text = str(data)
-        rows = text.split('\n')
-        if len(rows) > nrows:
-            rows = rows[:nrows]
-            rows.append('...')
-        if hasattr(data, 'shape'):
-            rows.insert(0, "shape=%r type=%r" % (data.shape, type(data)))
-        else:
-            rows.insert(0, "type=%r" % type(data))  # pragma: no cover
-        return "\n".join(rows)
 
 
-def alter_pipeline_for_debugging(pipe):
+class DebugBuffer:
+    """
+    External storage for the inputs and outputs of all models
+    recorded by @see fct debug_pipeline. Records are stored in the
+    order of @see fct enumerate_pipeline_models.
     """
-    Overwrite methods *transform*, *predict*, *predict_proba*
-    or *decision_function* to collect the last inputs and outputs
-    seen in these methods.
 
-    @param      pipe        *scikit-learn* pipeline
+    def __init__(self, copy: bool = True):
+        self.copy = copy
+        self.records: Dict[int, DebugRecord] = {}
 
-    The object *pipe* is modified, it should be copied
-    before calling this function if you need the object
-    untouched after that. The prediction is slower.
-    See notebook :ref:`visualizepipelinerst`.
+    def __contains__(self, model) -> bool:
+        return id(model) in self.records
+
+    def get(self, model) -> DebugRecord:
+        return self.records[id(model)]
+
+    def clear(self):
+        self.records.clear()
+
+
+def _debug_method(buffer: DebugBuffer, record: DebugRecord, name: str, func):
+    if name == 'get_feature_names_out':
+        def get_feature_names_out(input_features=None, *args, **kwargs):
+            record.inputs[name] = input_features
+            output_features = func(input_features, *args, **kwargs)
+            record.outputs[name] = output_features
+            return output_features
+
+        return get_feature_names_out
+
+    def method(X, *args, **kwargs):
+        return _record_call(record, name, func, record.model, buffer.copy, X, *args, **kwargs)
+
+    return method
+
+
+@contextmanager
+def debug_pipeline(pipe, buffer: Optional[DebugBuffer] = None, copy: bool = True) -> Iterator[DebugBuffer]:
     """
+    Temporarily overwrites methods *transform*, *predict*, *predict_proba*,
+    *decision_function* and *get_feature_names_out* of all models to collect
+    the last inputs and outputs seen in these methods. The recorded data is
+    stored in an external buffer and all models are restored on exit.
+    Consequently, the same pipeline can be instrumented repeatedly without
+    copying it.
 
-    def transform(self, X, *args, **kwargs):
-        self._debug.inputs['transform'] = X.copy()
-        y = self._debug.methods['transform'](self, X, *args, **kwargs)
-        self._debug.outputs['transform'] = y.copy()
-        return y
-
-    def predict(self, X, *args, **kwargs):
-        self._debug.inputs['predict'] = X.copy()
-        y = self._debug.methods['predict'](self, X, *args, **kwargs)
-        self._debug.outputs['predict'] = y.copy()
-        return y
-
-    def predict_proba(self, X, *args, **kwargs):
-        self._debug.inputs['predict_proba'] = X.copy()
-        y = self._debug.methods['predict_proba'](self, X, *args, **kwargs)
-        self._debug.outputs['predict_proba'] = y.copy()
-        return y
-
-    def decision_function(self, X, *args, **kwargs):
-        self._debug.inputs['decision_function'] = X.copy()
-        y = self._debug.methods['decision_function'](self, X, *args, **kwargs)
-        self._debug.outputs['decision_function'] = y.copy()
-        return y
-
-    def get_feature_names_out(self, feature_names, *args, **kwargs):
-        self._debug.inputs['get_feature_names_out'] = feature_names
-        output_features = self._debug.methods['get_feature_names_out'](self, feature_names, *args, **kwargs)
-        self._debug.outputs['get_feature_names_out'] = output_features
-        return output_features
-
-    new_methods = {
-        'decision_function': decision_function,
-        'transform': transform,
-        'predict': predict,
-        'predict_proba': predict_proba,
-        'get_feature_names_out': get_feature_names_out
-    }
-
-    if hasattr(pipe, '_debug'):
-        raise RuntimeError(  # pragma: no cover
-            "The same operator cannot be used twice in "
-            "the same pipeline or this method was called "
-            "a second time.")
-
-    for model_ in enumerate_pipeline_models(pipe):
-        model = model_[1]
-        model._debug = BaseEstimatorDebugInformation(model)
-        for k in model._debug.methods:
-            try:
-                setattr(model, k, MethodType(new_methods[k], model))
-            except AttributeError:  # pragma: no cover
-                warnings.warn("Unable to overwrite method '{}' for class "
-                              "{}.".format(k, type(model)))
+    @param      pipe        *scikit-learn* pipeline
+    @param      buffer      optional buffer to record into, a new one is created otherwise
+    @param      copy        store copies of all inputs and outputs, otherwise
+                            only references are stored
+    @return                 buffer containing the recorded data
+    """
+    if buffer is None:
+        buffer = DebugBuffer(copy)
+
+    patched = []
+    try:
+        for coordinate, model, _ in enumerate_pipeline_models(pipe):
+            if model in buffer and buffer.get(model).coordinate != coordinate:
+                # Same operator used twice in the pipeline
+                continue
+            record = DebugRecord(model, coordinate)
+            buffer.records[id(model)] = record
+
+            for name in DEBUG_METHODS:
+                func = getattr(model, name, None)
+                if func is None or not callable(func):
+                    continue
+
+                instance_attributes = getattr(model, '__dict__', {})
+                previous = instance_attributes.get(name, _MISSING)
+                try:
+                    setattr(model, name, _debug_method(buffer, record, name, func))
+                    patched.append((model, name, previous))
+                except AttributeError:  # pragma: no cover
+                    warnings.warn("Unable to overwrite method '{}' for class "
+                                  "{}.".format(name, type(model)))
+        yield buffer
+    finally:
+        for model, name, previous in reversed(patched):
+            if previous is _MISSING:
+                delattr(model, name)
+            else:
+                setattr(model, name, previous)
 
 
 def get_component(coordinate: Tuple[int], step):
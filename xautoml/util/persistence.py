@@ -0,0 +1,202 @@
+import json
+import os
+import pickle
+import shutil
+import warnings
+from dataclasses import asdict
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import joblib
+import numpy as np
+from ConfigSpace import ConfigurationSpace, Configuration
+from ConfigSpace.read_and_write import json as config_json
+
+from xautoml.models import RunHistory, MetaInformation, CandidateStructure, Candidate, Ensemble, LazyModel, \
+    identity
+
+FORMAT_VERSION = 2
+
+
+def save_run_history(rh: RunHistory, directory: str, compress: int = 0):
+    """
+    Stores a RunHistory in a directory that can be loaded again with load_run_history. The meta-data of all candidates
+    is stored column-wise in a single NPZ file, each ConfigurationSpace is serialized only once and all configurations
+    are stored as vectors of their ConfigurationSpace. Fitted pipelines, including the ensemble, are stored in separate
+    joblib files that are only loaded on demand.
+    :param rh: RunHistory to store
+    :param directory: target directory. Gets created if it does not exist yet
+    :param compress: joblib compression level for fitted pipelines. Compressed pipelines can not be memory-mapped.
+    Pipelines that are loaded lazily from a file are linked or copied as they are, ignoring this level
+    """
+    os.makedirs(os.path.join(directory, 'models'), exist_ok=True)
+
+    configspaces: List[ConfigurationSpace] = []
+    cs_index: Dict[str, int] = {}
+
+    def intern(cs: Optional[ConfigurationSpace]) -> int:
+        if cs is None:
+            return -1
+        key = str(cs)
+        if key not in cs_index:
+            cs_index[key] = len(configspaces)
+            configspaces.append(cs)
+        return cs_index[key]
+
+    transformers: List[Callable] = []
+    transformer_index: Dict[int, int] = {}
+    unpicklable: List[str] = []
+
+    def intern_transformer(c: Candidate) -> int:
+        fn = c.y_transformer
+        if fn is identity:
+            return -1
+        if id(fn) not in transformer_index:
+            try:
+                pickle.dumps(fn)
+                transformer_index[id(fn)] = len(transformers)
+                transformers.append(fn)
+            except (pickle.PicklingError, AttributeError, TypeError):
+                transformer_index[id(fn)] = -1
+        if transformer_index[id(fn)] < 0:
+            unpicklable.append(c.id)
+        return transformer_index[id(fn)]
+
+    structures = []
+    vectors: Dict[int, List[np.ndarray]] = {}
+    columns = {key: [] for key in ('ids', 'budget', 'status', 'loss', 'structure', 'configspace', 'row',
+                                   'transformer', 'model')}
+    runtimes, origins = [], []
+
+    for s_idx, s in enumerate(rh.structures):
+        structures.append({'cid': s.cid, 'configspace': intern(s.configspace)})
+        for c in s.configs:
+            cs = intern(c.config.configuration_space)
+            rows = vectors.setdefault(cs, [])
+
+            model = -1
+            if c.has_model:
+                model = len(columns['ids'])
+                _save_model(c._model, os.path.join(directory, 'models', '{}.joblib'.format(model)), compress)
+
+            columns['ids'].append(c.id)
+            columns['budget'].append(c.budget)
+            columns['status'].append(c.status)
+            columns['loss'].append(c.loss)
+            columns['structure'].append(s_idx)
+            columns['configspace'].append(cs)
+            columns['row'].append(len(rows))
+            columns['transformer'].append(intern_transformer(c))
+            columns['model'].append(model)
+            rows.append(c.config.get_array())
+            runtimes.append(c.runtime)
+            origins.append(c.origin)
+
+    ensemble_file = os.path.join(directory, 'models', 'ensemble.joblib')
+    if rh.ensemble.candidate.has_model and rh.ensemble._model is not None:
+        _save_model(rh.ensemble._model, ensemble_file, compress)
+    elif os.path.exists(ensemble_file):
+        os.remove(ensemble_file)
+
+    if len(unpicklable) > 0:
+        warnings.warn('The y_transformer of {} candidates ({}) can not be pickled. It is restored as identity '
+                      'transformation by load_run_history'.format(len(unpicklable), ', '.join(unpicklable[:5])))
+
+    np.savez(os.path.join(directory, 'candidates.npz'),
+             ids=np.array(columns['ids'], dtype=str),
+             budget=np.array(columns['budget'], dtype=float),
+             status=np.array(columns['status'], dtype=str),
+             loss=np.array(columns['loss'], dtype=float),
+             structure=np.array(columns['structure'], dtype=np.int32),
+             configspace=np.array(columns['configspace'], dtype=np.int32),
+             row=np.array(columns['row'], dtype=np.int32),
+             transformer=np.array(columns['transformer'], dtype=np.int32),
+             model=np.array(columns['model'], dtype=np.int32),
+             **{'vectors_{}'.format(cs): np.array(rows, dtype=float) for cs, rows in vectors.items()})
+
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({
+            'version': FORMAT_VERSION,
+            'default_configspace': intern(rh.default_configspace),
+            'configspaces': [config_json.write(cs) for cs in configspaces],
+            'structures': structures,
+            'runtimes': runtimes,
+            'origins': origins,
+            'ensemble': rh.ensemble.weight_map
+        }, f, default=float)
+
+    joblib.dump({
+        'meta': asdict(rh.meta),
+        'pipelines': [s.pipeline for s in rh.structures],
+        'transformers': transformers,
+        'explanations': rh.explanations
+    }, os.path.join(directory, 'objects.joblib'), compress=compress)
+
+
+def load_run_history(directory: str, mmap_mode: Optional[str] = 'r', max_resident_models: int = 32) -> RunHistory:
+    """
+    Loads a RunHistory stored with save_run_history. Fitted pipelines are not loaded directly but only on first access
+    :param directory: directory containing the stored RunHistory
+    :param mmap_mode: memory-mapping mode passed to joblib when loading fitted pipelines
+    :param max_resident_models: Maximum number of lazily loaded pipelines that are kept in memory at the same time
+    """
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta['version'] != FORMAT_VERSION:
+        raise ValueError('Unsupported run history format version {}'.format(meta['version']))
+
+    objects = joblib.load(os.path.join(directory, 'objects.joblib'))
+    configspaces = [config_json.read(cs) for cs in meta['configspaces']]
+    transformers = objects['transformers']
+
+    with np.load(os.path.join(directory, 'candidates.npz')) as npz:
+        columns = {key: npz[key] for key in npz.files}
+
+    structures = [CandidateStructure(s['cid'], configspaces[s['configspace']] if s['configspace'] >= 0 else None,
+                                     pipeline, [])
+                  for s, pipeline in zip(meta['structures'], objects['pipelines'])]
+
+    for i in range(len(columns['ids'])):
+        cs = columns['configspace'][i]
+        config = Configuration(configspaces[cs], vector=columns['vectors_{}'.format(cs)][columns['row'][i]],
+                               origin=meta['origins'][i])
+
+        model = None
+        if columns['model'][i] >= 0:
+            path = os.path.join(directory, 'models', '{}.joblib'.format(columns['model'][i]))
+            model = LazyModel(partial(joblib.load, path, mmap_mode=mmap_mode), path)
+
+        transformer = columns['transformer'][i]
+        candidate = Candidate(str(columns['ids'][i]), float(columns['budget'][i]), str(columns['status'][i]),
+                              float(columns['loss'][i]), meta['runtimes'][i], config, meta['origins'][i], model,
+                              transformers[transformer] if transformer >= 0 else identity)
+        structures[columns['structure'][i]].configs.append(candidate)
+
+    ensemble = None
+    path = os.path.join(directory, 'models', 'ensemble.joblib')
+    if os.path.exists(path):
+        ensemble = LazyModel(partial(joblib.load, path, mmap_mode=mmap_mode), path)
+
+    default_cs = meta['default_configspace']
+    return RunHistory(MetaInformation(**objects['meta']), configspaces[default_cs] if default_cs >= 0 else None,
+                      structures, Ensemble(ensemble, meta['ensemble']), objects['explanations'],
+                      max_resident_models=max_resident_models)
+
+
+def _save_model(model, file: str, compress: int):
+    if isinstance(model, LazyModel) and model.path is not None:
+        # Pipelines that are not loaded yet are stored without loading them
+        _link_or_copy(model.path, file)
+    else:
+        joblib.dump(model.load() if isinstance(model, LazyModel) else model, file, compress=compress)
+
+
+def _link_or_copy(source: str, target: str):
+    if os.path.exists(target):
+        if os.path.samefile(source, target):
+            return
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
@@ -1,7 +1,7 @@
 import math
-from copy import deepcopy
+from copy import copy, deepcopy
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Tuple, Optional
 
 import numpy as np
 import pandas as pd
@@ -13,7 +13,7 @@ from sklearn.tree import _tree, DecisionTreeClassifier
 from sklearn.tree._export import _compute_depth
 from sklearn.utils.validation import check_is_fitted
 
-from xautoml.output import OutputCalculator, RAW
+from xautoml.output import OutputCalculator, RAW, StepOutputs
 from xautoml.util.auto_sklearn import AutoSklearnUtils
 from xautoml.util.constants import SOURCE, SINK
 from xautoml.util.mlinsights import get_component, enumerate_pipeline_models
@@ -22,12 +22,17 @@ from xautoml.util.mlinsights import get_component, enumerate_pipeline_models
 def get_subpipeline(pipeline: Pipeline,
                     start_after: str,
                     X: pd.DataFrame,
-                    y: pd.Series) -> Tuple[Pipeline, pd.DataFrame, List[str]]:
+                    y: pd.Series,
+                    step_outputs: Optional[StepOutputs] = None) -> Tuple[Pipeline, pd.DataFrame, List[str]]:
+    """
+    :param step_outputs: Optional previously captured intermediate outputs of pipeline for X. Calculated if not provided
+    """
     if start_after == SOURCE or start_after == SINK or start_after == pipeline.steps[-1][0]:
         additional_features = []
     else:
-        df_handler = OutputCalculator()
-        inputs, outputs = df_handler.calculate_outputs(pipeline, X, y, method=RAW)
+        if step_outputs is None:
+            step_outputs = OutputCalculator.capture_outputs(pipeline, X)
+        inputs, outputs = OutputCalculator.format_outputs(step_outputs, y, method=RAW)
 
         for selected_coordinate, model, subset in enumerate_pipeline_models(pipeline):
             initial_step_name, initial_step = get_component(selected_coordinate, pipeline)
@@ -97,7 +102,7 @@ def get_subpipeline(pipeline: Pipeline,
                 current_step._validate_column_callables(new_input)
             elif isinstance(step, FeatureUnion):
                 modified_transformers = []
-                modified_input = pd.concat([inputs[step_name].copy(), new_input.copy().add_prefix('_')], axis=1)
+                modified_input = pd.concat([inputs[step_name], new_input.add_prefix('_')], axis=1)
 
                 for name, transformer in step.transformer_list:
                     if name == current_step_name:
@@ -122,23 +127,11 @@ def get_subpipeline(pipeline: Pipeline,
                                 outputs[initial_step_name].add_prefix('_').columns.tolist()
 
         pipeline = current_step
-        X = new_input.convert_dtypes()
+        X = _convert_dtypes(new_input)
         additional_features = list(set(new_input.columns) - set(initial_feature_names))
 
     # Column Indexing has to be done using index and not column names. Replace with numerical column selector
-    for coordinate, model, subset in enumerate_pipeline_models(pipeline):
-        col_transfomer = None
-        if isinstance(model, ColumnTransformer) and hasattr(model, 'feature_names_in_'):
-            col_transfomer = model
-        elif AutoSklearnUtils.isFeatTypeSplit(model) and hasattr(model.column_transformer, 'feature_names_in_'):
-            col_transfomer = model.column_transformer
-
-        if col_transfomer:
-            del col_transfomer.feature_names_in_
-            col_transfomer.transformers_ = [(name, t, col_transfomer._transformer_to_input_indices[name])
-                                            for name, t, _ in col_transfomer.transformers_]
-            col_transfomer.transformers = [(name, t, col_transfomer._transformer_to_input_indices[name])
-                                           for name, t, _ in col_transfomer.transformers]
+    pipeline = _numerical_column_selectors(pipeline)
 
     return pipeline, X, additional_features
 
@@ -241,6 +234,73 @@ class Node:
         }
 
 
+def _convert_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    sparse_columns = np.array([isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes], dtype=bool)
+    if not sparse_columns.any():
+        return df.convert_dtypes()
+
+    # Sparse columns are kept as they are to prevent densifying them
+    converted = pd.concat([df.iloc[:, idx] if is_sparse else df.iloc[:, idx].convert_dtypes()
+                           for idx, is_sparse in enumerate(sparse_columns)], axis=1)
+    converted.columns = df.columns
+    return converted
+
+
+def densify(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts all sparse columns of df into dense columns. Required for helpers fitting their own imputation and
+    encoding on df, which do not support pd.SparseDtype
+    """
+    sparse_columns = [isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes]
+    if not any(sparse_columns):
+        return df
+
+    dense = pd.concat([df.iloc[:, idx].sparse.to_dense() if is_sparse else df.iloc[:, idx]
+                       for idx, is_sparse in enumerate(sparse_columns)], axis=1)
+    dense.columns = df.columns
+    return dense
+
+
+def _numerical_column_selectors(model):
+    """
+    Replaces the column selectors of all fitted ColumnTransformers in model by numerical column indices. The given model
+    is not modified, instead shallow copies of all modified containers are returned. Fitted leaf estimators are shared
+    """
+    if isinstance(model, Pipeline):
+        steps = [(name, _numerical_column_selectors(step)) for name, step in model.steps]
+        if any(new is not old for (_, new), (_, old) in zip(steps, model.steps)):
+            model = copy(model)
+            model.steps = steps
+    elif isinstance(model, FeatureUnion):
+        transformer_list = [(name, _numerical_column_selectors(t)) for name, t in model.transformer_list]
+        if any(new is not old for (_, new), (_, old) in zip(transformer_list, model.transformer_list)):
+            model = copy(model)
+            model.transformer_list = transformer_list
+    elif AutoSklearnUtils.isChoice(model):
+        choice = _numerical_column_selectors(model.choice)
+        if choice is not model.choice:
+            model = copy(model)
+            model.choice = choice
+    elif AutoSklearnUtils.isFeatTypeSplit(model):
+        column_transformer = _numerical_column_selectors(model.column_transformer)
+        if column_transformer is not model.column_transformer:
+            model = copy(model)
+            model.column_transformer = column_transformer
+    elif isinstance(model, ColumnTransformer) and hasattr(model, 'transformers_'):
+        transformers_ = [(name, _numerical_column_selectors(t), columns) for name, t, columns in model.transformers_]
+        changed = any(new is not old for (_, new, _), (_, old, _) in zip(transformers_, model.transformers_))
+        if changed or hasattr(model, 'feature_names_in_'):
+            model = copy(model)
+            model.transformers_ = transformers_
+            if hasattr(model, 'feature_names_in_'):
+                del model.feature_names_in_
+                model.transformers_ = [(name, t, model._transformer_to_input_indices[name])
+                                       for name, t, _ in model.transformers_]
+                model.transformers = [(name, t, model._transformer_to_input_indices[name])
+                                      for name, t, _ in model.transformers]
+    return model
+
+
 def export_tree(ordinal_encoder, decision_tree, feature_names, cat_features, max_depth=10, decimals=2) -> Node:
     check_is_fitted(decision_tree)
     tree_ = decision_tree.tree_
@@ -0,0 +1,164 @@
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+Predictions = Tuple[np.ndarray, float]
+
+
+class PredictionStore:
+
+    def __init__(self, X: pd.DataFrame, load_model: Callable[[str], Optional[Pipeline]],
+                 directory: Optional[str] = None, max_probabilities: int = 32):
+        """
+        Central store for the predictions of all candidates on the test data set. Class labels and prediction durations
+        are computed at most once per model and kept for all candidates. Class probabilities are only computed on first
+        use and stored as compact float32 arrays. At most max_probabilities of them are kept in memory, evicted
+        probabilities are computed again on the next use. If a directory is provided, all predictions are written to
+        disk and the probabilities are memory-mapped instead. Predictions already stored in the directory are reused
+        instead of evaluating the model again.
+
+        :param X: test data set used for all predictions
+        :param load_model: callable returning the fitted model of a candidate or None if no model is available
+        :param directory: optional directory used for persisting the predictions. Must only be shared by stores using
+        the same test data set
+        :param max_probabilities: maximum number of class probability arrays kept in memory
+        """
+        self.X = X
+        self.directory = directory
+        self.max_probabilities = max_probabilities
+        self._load_model = load_model
+
+        self._proba: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._no_proba: Set[str] = set()
+        self._labels: Dict[str, np.ndarray] = {}
+        self._durations: Dict[str, float] = {}
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def evaluate(model: Pipeline, X: pd.DataFrame) -> Predictions:
+        """
+        Computes the class labels and prediction duration of a single model
+        """
+        # Models may modify their input in place. Each prediction works on a private copy of the shared data set
+        X = X.copy()
+        start = time.time()
+        labels = np.asarray(model.predict(X))
+        duration = time.time() - start
+        return labels, duration
+
+    @staticmethod
+    def probabilities(model: Pipeline, X: pd.DataFrame) -> Optional[np.ndarray]:
+        """
+        Computes the class probabilities of a single model or None if the model does not provide probabilities
+        """
+        try:
+            proba = model.predict_proba(X.copy())
+        except (AttributeError, NotImplementedError):
+            return None
+        return np.asarray(proba, dtype=np.float32)
+
+    def add(self, cid: str, labels: np.ndarray, duration: float):
+        if self.directory is not None:
+            # The existence of this file marks complete predictions
+            self._write(cid, '.labels.npz', lambda f: np.savez(f, labels=labels, duration=duration))
+
+        self._labels[cid] = labels
+        self._durations[cid] = duration
+
+    def add_proba(self, cid: str, proba: Optional[np.ndarray]):
+        if proba is None:
+            self._no_proba.add(cid)
+            return
+
+        if self.directory is not None:
+            self._write(cid, '.npy', lambda f: np.save(f, proba))
+            proba = np.load(self._file(cid, '.npy'), mmap_mode='r')
+        self._put_proba(cid, proba)
+
+    def predict(self, cid: str) -> np.ndarray:
+        self._ensure(cid)
+        return self._labels[cid]
+
+    def predict_proba(self, cid: str) -> np.ndarray:
+        if cid in self._proba:
+            self._proba.move_to_end(cid)
+            return self._proba[cid]
+        if cid not in self._no_proba and not self._load_proba(cid):
+            model = self._model(cid)
+            if cid not in self._labels and not self._load(cid):
+                # Computed together to load the model only once
+                self.add(cid, *PredictionStore.evaluate(model, self.X))
+            self.add_proba(cid, PredictionStore.probabilities(model, self.X))
+
+        if cid in self._no_proba:
+            raise ValueError('Candidate {} does not provide class probabilities'.format(cid))
+        return self._proba[cid]
+
+    def duration(self, cid: str) -> float:
+        self._ensure(cid)
+        return self._durations[cid]
+
+    def __contains__(self, cid: str) -> bool:
+        return cid in self._labels or self._load(cid)
+
+    def _ensure(self, cid: str):
+        if cid in self._labels or self._load(cid):
+            return
+        self.add(cid, *PredictionStore.evaluate(self._model(cid), self.X))
+
+    def _model(self, cid: str) -> Pipeline:
+        model = self._load_model(cid)
+        if model is None:
+            raise ValueError('Candidate {} does not exist or has no fitted model'.format(cid))
+        return model
+
+    def _load(self, cid: str) -> bool:
+        if self.directory is None or not os.path.exists(self._file(cid, '.labels.npz')):
+            return False
+
+        with np.load(self._file(cid, '.labels.npz'), allow_pickle=True) as stored:
+            labels, duration = stored['labels'], float(stored['duration'])
+        if labels.shape[0] != self.X.shape[0]:
+            return False
+
+        self._labels[cid] = labels
+        self._durations[cid] = duration
+        return True
+
+    def _load_proba(self, cid: str) -> bool:
+        if self.directory is None or not os.path.exists(self._file(cid, '.npy')):
+            return False
+
+        proba = np.load(self._file(cid, '.npy'), mmap_mode='r')
+        if proba.shape[0] != self.X.shape[0]:
+            return False
+        self._put_proba(cid, proba)
+        return True
+
+    def _put_proba(self, cid: str, proba: np.ndarray):
+        self._proba[cid] = proba
+        self._proba.move_to_end(cid)
+        while len(self._proba) > self.max_probabilities:
+            self._proba.popitem(last=False)
+
+    def _write(self, cid: str, suffix: str, write: Callable):
+        # Written to a temporary file first, so that other stores sharing the directory never read partial files
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, self._file(cid, suffix))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def _file(self, cid: str, suffix: str) -> str:
+        return os.path.join(self.directory, '{}{}'.format(cid.replace(':', '_'), suffix))